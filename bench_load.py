@@ -0,0 +1,295 @@
+"""Load test for mention processing and game resolution.
+
+Runs the bot in-process against the fake X backend (xapi.FakeX) and a
+temporary database. It generates a population of users and a batch of
+mentions: invites, random-match requests, moves around the deadlines of
+pending games, and noise. Then it times each stage:
+
+  ingest    ingest_mentions(), including recording moves
+  process   process_mentions(), with per-mention latency
+  settle    settling every pending game once its timer is due
+  outbox    posting every queued reply and announcement
+
+For each stage it reports wall time, the time spent inside SQLite calls,
+throughput, and X API calls. The results are also written as JSON. Pass
+--baseline with an earlier results file to print the change. With
+--runtime async, ingest, process and outbox run the asyncio versions, which
+only differ from the threaded ones once --latency is set.
+
+Usage: python bench_load.py [--users 2000] [--mentions 5000] [--games 1000] [--latency 0]
+                            [--runtime threads] [--seed 1] [--output bench_load.json] [--baseline old.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+
+from xapi import FakeX
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tas-makas-kagit-pyton.py")
+
+MOVES = ["taş", "kağıt", "makas", "rock", "paper", "scissors"]
+NOISE = ["gm", "@apsnygame 🔥", "@apsnygame nasıl oynanır?", "@apsnygame how do I play", "@apsnygame $BSC"]
+
+
+class TimedConnection(sqlite3.Connection):
+    """Adds the time spent in execute calls to TimedConnection.elapsed."""
+
+    elapsed = 0.0
+
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            TimedConnection.elapsed += time.perf_counter() - start
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            TimedConnection.elapsed += time.perf_counter() - start
+
+
+def load_bot(db_path):
+    os.environ["DB_PATH"] = db_path
+    connect = sqlite3.connect
+    sqlite3.connect = lambda *args, **kwargs: connect(*args, factory=TimedConnection, **kwargs)
+    spec = importlib.util.spec_from_file_location("bot", SCRIPT)
+    bot = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bot)
+    return bot
+
+
+def populate(fake, args, rng):
+    """Users plus the mention mix; returns (user IDs, games to settle as (game_id, user1, user2))."""
+    users = []
+    for i in range(args.users):
+        # About one in ten accounts is too young or too quiet to play
+        young = rng.random() < 0.1
+        fake.add_user(f"{100 + i}", f"player{i}", age_days=rng.randint(1, 20) if young else rng.randint(40, 3000),
+                      tweet_count=rng.randint(0, 5000), description=rng.choice(["", "İstanbul", "crypto", "şans"]))
+        users.append(f"{100 + i}")
+    # A pair can only have one pending game, so every game gets a pair of its own
+    games, pairs = [], set()
+    while len(games) < args.games:
+        pair = rng.sample(users, 2)
+        if frozenset(pair) not in pairs:
+            pairs.add(frozenset(pair))
+            games.append((f"bench_{len(games)}", *pair))
+    for _ in range(args.mentions):
+        author = rng.choice(users)
+        roll = rng.random()
+        if roll < 0.3:
+            invited = rng.randrange(args.users)
+            text = f"@apsnygame {rng.choice(['#oyun', 'oyun', '#game', 'game'])} @player{invited}"
+            fake.post_mention(author, text, mentioned=(f"player{invited}",))
+        elif roll < 0.6:
+            fake.post_mention(author, f"@apsnygame {rng.choice(['oyun', 'game', '#oyun istiyorum'])}")
+        else:
+            fake.post_mention(author, rng.choice(NOISE))
+    return users, games
+
+
+def post_moves(fake, bot, games, deadline, rng):
+    """Moves for the pending games: mostly inside the move window, some late, some missing."""
+    for _, user1, user2 in games:
+        for user_id in (user1, user2):
+            roll = rng.random()
+            if roll < 0.8:
+                offset = rng.uniform(0, bot.MOVE_WINDOW_SECONDS)
+            elif roll < 0.9:
+                offset = rng.uniform(bot.MOVE_WINDOW_SECONDS + 1, 60)
+            else:
+                continue
+            fake.post_mention(user_id, f"@apsnygame {rng.choice(MOVES)}",
+                              created_at=deadline + datetime.timedelta(seconds=offset))
+
+
+def drain_outbox(bot):
+    while bot.send_outbox_tweet():
+        pass
+
+
+async def drain_outbox_async(bot, limit):
+    sender = asyncio.create_task(bot.run_outbox_async(bot.x_async_backend(), limit))
+    while bot.db().execute("SELECT 1 FROM outbox WHERE status IN ('pending', 'sending') LIMIT 1").fetchone():
+        await asyncio.sleep(0.01)
+    sender.cancel()
+    bot.outbox_wakeup.set()  # so asyncio.run() doesn't wait out the sender's idle wait
+
+
+def stage_functions(bot, runtime):
+    """The ingest, process and outbox stages for the chosen runtime."""
+    if runtime == "threads":
+        return bot.ingest_mentions, bot.process_mentions, lambda: drain_outbox(bot)
+    limit = asyncio.Semaphore(bot.ASYNC_MAX_REQUESTS)
+    backend = bot.x_async_backend()
+    return (lambda: asyncio.run(bot.ingest_mentions_async(backend, limit)),
+            lambda: asyncio.run(bot.process_mentions_async(backend, limit)),
+            lambda: asyncio.run(drain_outbox_async(bot, limit)))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+def stage(results, name, fake, count, fn):
+    """Run fn and record its wall time, SQLite time, throughput and API calls."""
+    calls_before = sum(fake.calls.values())
+    sql_before = TimedConnection.elapsed
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    results[name] = {
+        "count": count,
+        "seconds": round(seconds, 4),
+        "sqlite_seconds": round(TimedConnection.elapsed - sql_before, 4),
+        "per_minute": round(count / seconds * 60) if seconds else None,
+        "api_calls": sum(fake.calls.values()) - calls_before,
+    }
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            bot = load_bot(os.path.join(tmp, "rps_game.db"))
+            bot.init_db()
+        fake = FakeX(latency=args.latency, rate_limits={}, seed=args.seed)
+        bot.use_backend(fake)
+        users, games = populate(fake, args, rng)
+
+        # Pending games whose deadline has just passed
+        deadline = datetime.datetime.utcnow().replace(microsecond=0) - datetime.timedelta(minutes=2)
+        with bot.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO users (user_id, username, language) VALUES (?, ?, 'en')",
+                             [(user_id, f"player{int(user_id) - 100}") for user_id in users])
+            conn.executemany(
+                "INSERT INTO games (game_id, user1_id, user2_id, deadline, status) VALUES (?, ?, ?, ?, 'pending')",
+                [(game_id, user1, user2, deadline.isoformat()) for game_id, user1, user2 in games]
+            )
+            for game_id, _, _ in games:
+                bot.schedule_timer(bot.settle_timer(game_id, deadline.isoformat()))
+        post_moves(fake, bot, games, deadline, rng)
+        mention_count = len(fake._mentions)
+
+        latencies = []
+        handle_mention = bot.handle_mention
+
+        def timed_handle_mention(*handle_args):
+            start = time.perf_counter()
+            outcome = handle_mention(*handle_args)
+            latencies.append(time.perf_counter() - start)
+            return outcome
+
+        bot.handle_mention = timed_handle_mention
+        ingest, process, outbox_stage = stage_functions(bot, args.runtime)
+        results = {}
+        with contextlib.redirect_stdout(devnull):
+            stage(results, "ingest", fake, mention_count, ingest)
+            stage(results, "process", fake, mention_count, process)
+            due = [timer for timer in bot.timers.pop_due(time.time()) if timer.kind == "settle"]
+            stage(results, "settle", fake, len(due), lambda: [bot.settle_due_game(timer) for timer in due])
+            outbox = bot.db().execute("SELECT COUNT(*) FROM outbox WHERE status='pending'").fetchone()[0]
+            stage(results, "outbox", fake, outbox, outbox_stage)
+        bot.handle_mention = handle_mention
+
+        conn = bot.db()
+        outcome = {
+            "moves_recorded": conn.execute("SELECT COUNT(*) FROM moves").fetchone()[0],
+            "games_created": conn.execute("SELECT COUNT(*) FROM games WHERE game_id NOT LIKE 'bench_%'").fetchone()[0],
+            "games_settled": conn.execute("SELECT COUNT(*) FROM games WHERE status='completed'").fetchone()[0],
+            "waiting_for_opponent": len(bot.matchmaking),
+            "tweets_posted": len(fake.tweets),
+            "tweets_duplicate": conn.execute("SELECT COUNT(*) FROM outbox WHERE status='duplicate'").fetchone()[0],
+        }
+
+    return {
+        "version": git_version(),
+        "generated_at": datetime.datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "config": vars(args),
+        "stages": results,
+        "mention_latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "mean": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        },
+        "api_calls": dict(fake.calls),
+        "api_calls_per_mention": round(sum(fake.calls.values()) / mention_count, 4),
+        "outcome": outcome,
+    }
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(SCRIPT), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(result, baseline=None):
+    def change(value, old):
+        return f"  ({(value - old) / old:+.0%} vs baseline)" if old else ""
+
+    if baseline and {k: v for k, v in baseline["config"].items() if k not in ("output", "baseline")} != \
+            {k: v for k, v in result["config"].items() if k not in ("output", "baseline")}:
+        print(f"Note: baseline {baseline['version']} ran with a different configuration")
+    print(f"{result['config']['mentions']} mentions, {result['config']['users']} users, "
+          f"{result['config']['games']} pending games, {result['config'].get('runtime', 'threads')} runtime, "
+          f"version {result['version']}")
+    for name, numbers in result["stages"].items():
+        old = (baseline or {}).get("stages", {}).get(name, {})
+        print(f"  {name:<8} {numbers['count']:>6} in {numbers['seconds']:7.3f}s "
+              f"(sqlite {numbers['sqlite_seconds']:7.3f}s), {numbers['per_minute'] or 0:>9}/min, "
+              f"{numbers['api_calls']:>5} API calls{change(numbers['seconds'], old.get('seconds'))}")
+    latency = result["mention_latency_ms"]
+    old = (baseline or {}).get("mention_latency_ms", {})
+    print(f"  per-mention latency p50 {latency['p50']:.3f} ms{change(latency['p50'], old.get('p50'))}, "
+          f"p99 {latency['p99']:.3f} ms{change(latency['p99'], old.get('p99'))}")
+    print(f"  API calls per mention {result['api_calls_per_mention']} {result['api_calls']}")
+    print(f"  outcome {result['outcome']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--mentions", type=int, default=5000)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per fake X API call")
+    parser.add_argument("--runtime", choices=("threads", "async"), default="threads")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_load.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args()
+    if args.games > args.users * (args.users - 1) // 2:
+        parser.error("--games can't exceed the number of distinct pairs of --users")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    result = run(args)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    report(result, baseline)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
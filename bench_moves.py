@@ -0,0 +1,88 @@
+"""Micro-benchmark for the move parser over a corpus of generated mentions.
+
+Usage: python bench_moves.py [--count 20000] [--repeat 5] [--seed 1]
+"""
+import argparse
+import random
+import time
+
+from moves import MOVES, fold, parse_move_word
+
+LEGACY_WORDS = ["taş", "kağıt", "makas", "rock", "paper", "scissors"]
+
+HANDLES = ["@apsnygame", "@ayse_k", "@mehmet34", "@cryptoKing", "@bsc_fan", "@Lara"]
+HASHTAGS = ["#taşkağıtmakas", "#rockpaperscissors", "#oyun", "#game", "#BSC"]
+FILLER = [
+    "hadi bakalım", "bu sefer kazanacağım", "let's go", "gm", "good luck", "kolay gelsin",
+    "tam zamanında", "on time!", "🔥🔥", "😎", "saat 20:00", "ready", "iyi oyunlar", "$BSC",
+]
+MOVE_SPELLINGS = [
+    "taş", "TAŞ", "Taş", "tas", "kağıt", "KAĞIT", "kagit", "makas", "MAKAS",
+    "rock", "Rock", "ROCK", "paper", "PAPER", "scissors", "Scissors",
+]
+FALSE_FRIENDS = ["makaslar", "rocket", "papers", "taşlar", "kağıtçı", "rockstar"]
+
+
+def legacy_parse(text):
+    """The substring scan check_games used before the tokenizer."""
+    text = text.lower()
+    if any(c in text for c in LEGACY_WORDS):
+        return next((c for c in LEGACY_WORDS if c in text), None)
+    return None
+
+
+def make_corpus(count, seed):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        words = ["@apsnygame"]
+        roll = rng.random()
+        if roll < 0.55:
+            words.append(rng.choice(MOVE_SPELLINGS))
+        elif roll < 0.65:
+            words += rng.sample(MOVE_SPELLINGS, 2)
+        elif roll < 0.75:
+            words.append(rng.choice(FALSE_FRIENDS))
+        else:
+            words.append(rng.choice(["oyun", "game", "oyun istiyorum", "play?"]))
+        words += rng.sample(FILLER, rng.randint(0, 3))
+        if rng.random() < 0.3:
+            words.append(rng.choice(HANDLES))
+        if rng.random() < 0.3:
+            words.append(rng.choice(HASHTAGS))
+        rng.shuffle(words)
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def bench(func, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.count, args.seed)
+    moves = [parse_move_word(text)[0] for text in corpus]
+    print(f"corpus: {len(corpus)} mentions, {sum(m is not None for m in moves)} with a move")
+    differ = sum((legacy and MOVES[fold(legacy)]) != move for legacy, move in zip(map(legacy_parse, corpus), moves))
+    print(f"legacy scan disagrees on {differ} mentions (substring hits, ambiguous tweets)")
+
+    # parse_move_word is what record_move calls for every stored mention
+    for name, func in (("parse_move_word", parse_move_word), ("legacy", legacy_parse)):
+        elapsed = bench(func, corpus, args.repeat)
+        print(f"{name:>15}: {len(corpus) / elapsed:,.0f} mentions/s ({elapsed * 1e6 / len(corpus):.2f} µs/mention)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Startup-time benchmark for the bot script.
+
+Every trial runs in a fresh interpreter against a temp database that is
+already migrated and has the bot identity cached, the way a supervisor
+restart finds it. The X credentials are removed from the environment, so
+any call to X during startup fails the trial.
+
+Usage: python bench_startup.py [--repeat 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tas-makas-kagit-pyton.py")
+
+TRIAL = """
+import importlib.util, json, sys, time
+stages = {}
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("bot", sys.argv[1])
+bot = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bot)
+stages["import"] = time.perf_counter() - start
+mark = time.perf_counter()
+bot.init_db()
+stages["init_db"] = time.perf_counter() - mark
+mark = time.perf_counter()
+me = bot.bot_identity()
+stages["bot_identity"] = time.perf_counter() - mark
+mark = time.perf_counter()
+bot.create_app()
+stages["create_app"] = time.perf_counter() - mark
+stages["total"] = time.perf_counter() - start
+print(json.dumps(stages))
+"""
+
+
+def prepare(db_path):
+    """Migrate a temp database and cache a bot identity in it."""
+    code = (
+        "import importlib.util, sys\n"
+        "spec = importlib.util.spec_from_file_location('bot', sys.argv[1])\n"
+        "bot = importlib.util.module_from_spec(spec); spec.loader.exec_module(bot)\n"
+        "bot.init_db()\n"
+        "bot.db().executemany('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',"
+        " [('bot_user_id', '1'), ('bot_username', 'apsnygame')])\n"
+    )
+    subprocess.run([sys.executable, "-c", code, SCRIPT], env=environment(db_path), check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def environment(db_path):
+    env = {k: v for k, v in os.environ.items() if k not in
+           ("CONSUMER_KEY", "CONSUMER_SECRET", "ACCESS_TOKEN", "ACCESS_TOKEN_SECRET")}
+    env["DB_PATH"] = db_path
+    return env
+
+
+def trial(db_path):
+    out = subprocess.run([sys.executable, "-c", TRIAL, SCRIPT], env=environment(db_path), check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "rps_game.db")
+        prepare(db_path)
+        trials = [trial(db_path) for _ in range(args.repeat)]
+
+    print(f"{args.repeat} fresh-interpreter startups, no X credentials")
+    for stage in trials[0]:
+        times = sorted(t[stage] * 1000 for t in trials)
+        print(f"  {stage:<13} median {statistics.median(times):7.1f} ms   max {times[-1]:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
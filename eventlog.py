@@ -0,0 +1,136 @@
+"""Structured logging that keeps I/O off the calling thread.
+
+Events are a name plus fields, e.g. log.info("match_created", game_id=...).
+The calling thread only puts the record on a bounded queue. A background
+QueueListener formats each record as one JSON line and writes it out. When
+the queue is full, records are dropped and counted rather than blocking the
+bot. High-volume events can be sampled: with a rate of N, one in N is kept,
+and the kept one carries "sampled": N.
+
+Until configure() is called, events go to the standard logging setup, so
+tools that import the bot stay quiet.
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from collections import Counter
+
+_sample_rates = {}
+_seen = Counter()
+_seen_lock = threading.Lock()
+_state = {"handler": None, "listener": None}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting is left to the writer thread, only a traceback has to be rendered now
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class EventLogger:
+    def __init__(self, name):
+        self._logger = logging.getLogger(name)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        """Log at error level with the traceback of the exception being handled."""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+    def _log(self, level, event, fields, exc_info=False):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = _sample_rates.get(event)
+        if rate and rate > 1:
+            with _seen_lock:
+                _seen[event] += 1
+                keep = _seen[event] % rate == 1
+            if not keep:
+                return
+            fields["sampled"] = rate
+        self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+
+def get(name):
+    return EventLogger(name)
+
+
+def parse_sample_rates(spec):
+    """Parse "event=N,other=M" into a dict of event to N."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = int(rate)
+    return rates
+
+
+def configure(level="INFO", sample_rates=None, queue_size=10000, stream=None):
+    """Route all logging through a queue to a JSON writer thread; calling it again replaces the setup."""
+    shutdown()
+    _sample_rates.clear()
+    _sample_rates.update(sample_rates or {})
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    handler = _QueueHandler(queue.Queue(queue_size))
+    listener = logging.handlers.QueueListener(handler.queue, writer)
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    listener.start()
+    _state.update(handler=handler, listener=listener)
+
+
+def shutdown():
+    """Write out what is still queued and stop the writer thread."""
+    if _state["listener"] is not None:
+        _state["listener"].stop()
+        _state["listener"] = None
+
+
+atexit.register(shutdown)
+
+
+def dropped():
+    """Records dropped because the queue was full."""
+    return _state["handler"].dropped if _state["handler"] else 0
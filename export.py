@@ -0,0 +1,103 @@
+"""Streaming file export for reports.
+
+Rows are written as they are read, as NDJSON or CSV and optionally gzipped,
+to a temp file next to the target that is renamed into place once complete.
+A <file>.manifest.json with the row count, size and checksum is written the
+same way, so readers never see a partial report.
+"""
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+FORMATS = ("ndjson", "csv")
+
+
+class _CountingWriter(io.RawIOBase):
+    """Passes bytes through to a file while counting and hashing them."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.raw.write(data)
+        self.size += len(data)
+        self.sha256.update(data)
+        return len(data)
+
+
+def _write_atomically(path, write):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            result = write(raw)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return result
+
+
+def export_rows(path, fields, chunks, fmt="ndjson", compress=False):
+    """Write rows from an iterable of row chunks to path and return the manifest dict.
+
+    Only one chunk is held in memory at a time.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+
+    def write(raw):
+        counter = _CountingWriter(raw)
+        binary = gzip.GzipFile(fileobj=counter, mode="wb", mtime=0) if compress else counter
+        text = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+        writer = csv.writer(text) if fmt == "csv" else None
+        if writer:
+            writer.writerow(fields)
+        rows = 0
+        for chunk in chunks:
+            for row in chunk:
+                if writer:
+                    writer.writerow(row)
+                else:
+                    text.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n")
+            rows += len(chunk)
+        text.flush()
+        text.detach()
+        if compress:
+            binary.close()
+        return rows, counter
+
+    rows, counter = _write_atomically(path, write)
+    manifest = {
+        "file": os.path.basename(path),
+        "format": fmt,
+        "gzip": compress,
+        "fields": fields,
+        "rows": rows,
+        "bytes": counter.size,
+        "sha256": counter.sha256.hexdigest(),
+        "generated_at": datetime.datetime.utcnow().isoformat(),
+    }
+    _write_atomically(path + ".manifest.json", lambda raw: raw.write(json.dumps(manifest, indent=2).encode()))
+    return manifest
+
+
+def fetch_chunks(cursor, size):
+    """Iterate a sqlite3 cursor's result in lists of at most size rows."""
+    while True:
+        chunk = cursor.fetchmany(size)
+        if not chunk:
+            return
+        yield chunk
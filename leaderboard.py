@@ -0,0 +1,80 @@
+"""In-memory leaderboard kept up to date as games are settled.
+
+Every ranking (by wins, by BSC balance, by win rate) is a sorted list of
+keys ending in user_id, so reading the top N is a slice, looking up a
+player's rank is a bisect and updating a player is a bisect plus one list
+insert per ranking.
+"""
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+Player = namedtuple("Player", ["user_id", "username", "wins", "bsc_balance", "games_played"])
+
+
+def win_rate(player):
+    return player.wins / player.games_played if player.games_played else 0.0
+
+
+# Sort keys, best first; ties are broken the same way as the SQL pages in the bot
+RANKINGS = {
+    "wins": lambda p: (-p.wins, -p.bsc_balance, p.user_id),
+    "balance": lambda p: (-p.bsc_balance, -p.wins, p.user_id),
+    "win_rate": lambda p: (-win_rate(p), -p.wins, p.user_id),
+}
+
+
+class Leaderboard:
+    def __init__(self):
+        self._players = {}
+        self._by_username = {}
+        self._orders = {name: [] for name in RANKINGS}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.last_modified = time.time()
+
+    def load(self, players):
+        with self._lock:
+            self._players = {p.user_id: p for p in players}
+            self._by_username = {p.username.lower(): p.user_id for p in self._players.values()}
+            for name, key in RANKINGS.items():
+                self._orders[name] = sorted(key(p) for p in self._players.values())
+            self._changed()
+
+    def update(self, player):
+        """Insert or move one player."""
+        with self._lock:
+            old = self._players.get(player.user_id)
+            if old == player:
+                return
+            for name, key in RANKINGS.items():
+                order = self._orders[name]
+                if old is not None:
+                    del order[bisect.bisect_left(order, key(old))]
+                bisect.insort(order, key(player))
+            if old is not None:
+                self._by_username.pop(old.username.lower(), None)
+            self._by_username[player.username.lower()] = player.user_id
+            self._players[player.user_id] = player
+            self._changed()
+
+    def top(self, n, sort="wins"):
+        with self._lock:
+            return [self._players[key[-1]] for key in self._orders[sort][:n]]
+
+    def rank(self, username, sort="wins"):
+        """Return (rank, player) for a username, rank 1 being the best, or None."""
+        with self._lock:
+            user_id = self._by_username.get(username.lower())
+            if user_id is None:
+                return None
+            player = self._players[user_id]
+            return bisect.bisect_left(self._orders[sort], RANKINGS[sort](player)) + 1, player
+
+    def __len__(self):
+        return len(self._players)
+
+    def _changed(self):
+        self.version += 1
+        self.last_modified = time.time()
@@ -0,0 +1,124 @@
+"""In-memory matchmaking queue for random matches.
+
+Waiting players sit in buckets keyed by (language, skill band). Each bucket
+is an OrderedDict in arrival order, so adding, removing and looking at the
+longest-waiting player of a bucket are all O(1). Finding an opponent checks a
+fixed number of buckets, independent of how many players are waiting.
+
+The queue only holds state in memory; the caller persists entries (see the
+match_queue table in the bot) and rebuilds the queue with load() at startup.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+Entry = namedtuple("Entry", ["user_id", "username", "language", "band", "enqueued_at", "mention_id"])
+
+
+class MatchQueue:
+    """Waiting players bucketed by language and win-rate band.
+
+    A new player is paired with the longest-waiting player of their own
+    bucket. The longer someone waits, the further they accept to reach:
+    one more band for every age_step seconds, and any language once they
+    have waited cross_language_after seconds. Entries older than max_wait
+    seconds are dropped by expire().
+    """
+
+    def __init__(self, bands=1, age_step=600, cross_language_after=1800, max_wait=86400):
+        self.bands = max(bands, 1)
+        self.age_step = age_step
+        self.cross_language_after = cross_language_after
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def band_for(self, wins, games_played, min_games=5):
+        """Skill band of a player; players with too few games go in the middle."""
+        if self.bands == 1 or games_played < min_games:
+            return self.bands // 2
+        return min(int(wins / games_played * self.bands), self.bands - 1)
+
+    def load(self, entries):
+        with self._lock:
+            self._buckets.clear()
+            self._entries.clear()
+            for entry in sorted(entries, key=lambda e: e.enqueued_at):
+                self._add(entry)
+
+    def add(self, entry):
+        with self._lock:
+            self._remove(entry.user_id)
+            self._add(entry)
+
+    def remove(self, user_id):
+        with self._lock:
+            return self._remove(user_id)
+
+    def pair(self, entry, now):
+        """Take and return the best waiting opponent for entry, or None.
+
+        entry itself is not added; the caller adds it when no opponent is found.
+        """
+        with self._lock:
+            best = None
+            for language, bucket in self._buckets.items():
+                for band, players in bucket.items():
+                    opponent = self._head(players, entry.user_id)
+                    if opponent is None:
+                        continue
+                    waited = now - opponent.enqueued_at
+                    if language != entry.language and waited < self.cross_language_after:
+                        continue
+                    if abs(band - entry.band) * self.age_step > waited:
+                        continue
+                    rank = (language != entry.language, abs(band - entry.band), opponent.enqueued_at)
+                    if best is None or rank < best[0]:
+                        best = (rank, opponent)
+            if best is None:
+                return None
+            self._remove(best[1].user_id)
+            return best[1]
+
+    def expire(self, now):
+        """Drop and return entries that waited longer than max_wait."""
+        expired = []
+        with self._lock:
+            for bucket in self._buckets.values():
+                for players in bucket.values():
+                    while players:
+                        oldest = next(iter(players.values()))
+                        if now - oldest.enqueued_at < self.max_wait:
+                            break
+                        expired.append(oldest)
+                        self._remove(oldest.user_id)
+        return expired
+
+    def depth(self):
+        """Number of waiting players per language."""
+        with self._lock:
+            return {language: sum(len(players) for players in bucket.values())
+                    for language, bucket in self._buckets.items()}
+
+    def _head(self, players, exclude):
+        for user_id, entry in players.items():
+            if user_id != exclude:
+                return entry
+        return None
+
+    def _add(self, entry):
+        players = self._buckets.setdefault(entry.language, {}).setdefault(entry.band, OrderedDict())
+        players[entry.user_id] = entry
+        self._entries[entry.user_id] = entry
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            del self._buckets[entry.language][entry.band][entry.user_id]
+        return entry
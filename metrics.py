@@ -0,0 +1,208 @@
+"""Prometheus metrics in the text exposition format.
+
+Just enough of the Prometheus client to instrument the bot: counters,
+gauges and histograms, with optional labels. Metrics register themselves in
+REGISTRY, and render() writes the text served at /metrics. A gauge can take
+a function that is called at scrape time. That suits values the bot already
+holds, like queue depth or rate-limit state.
+"""
+import bisect
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_labels(labels)} {_number(value)}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def render():
+    return REGISTRY.render()
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self.labels()
+        registry.register(self)
+
+    def labels(self, *values):
+        """The child for one combination of label values."""
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}")
+        key = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def samples(self):
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            yield from child.samples(self.name, tuple(zip(self.label_names, key)))
+
+    def _default(self):
+        if self.label_names:
+            raise ValueError(f"{self.name} needs labels {self.label_names}")
+        return self.labels()
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def samples(self):
+        for name, labels, value in super().samples():
+            yield name + "_total", labels, value
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; with function, it is read at scrape time.
+
+    function returns a number, or for a labelled gauge a dict of label value
+    tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY, function=None):
+        self.function = function
+        super().__init__(name, help, labels, registry)
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def samples(self):
+        if self.function is None:
+            yield from super().samples()
+            return
+        values = self.function()
+        if not self.label_names:
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            if value is not None:
+                yield self.name, tuple(zip(self.label_names, map(str, key))), value
+
+
+class _Buckets:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.sum += value
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            cumulative += count
+            yield name + "_bucket", labels + (("le", _number(float(bound))),), cumulative
+        yield name + "_sum", labels, total
+        yield name + "_count", labels, cumulative
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self, *labels):
+        """Context manager that observes how long its block took."""
+        return _Timer(self.labels(*labels))
+
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.start)
@@ -0,0 +1,45 @@
+"""Move parsing for mention texts."""
+import re
+
+# Canonical move for every accepted spelling, after fold()
+MOVES = {
+    "tas": "rock",
+    "kagit": "paper",
+    "makas": "scissors",
+    "rock": "rock",
+    "paper": "paper",
+    "scissors": "scissors",
+}
+
+# Turkish letters folded to ASCII; "İ".lower() leaves a combining dot behind, drop it
+_FOLD = str.maketrans({"ı": "i", "ş": "s", "ğ": "g", "ç": "c", "ö": "o", "ü": "u", "̇": None})
+
+# Runs on lowercased text, so Turkish letters and their ASCII stand-ins are matched
+# here and only the (rare) matched word goes through fold(). Whole words only,
+# and never part of an @handle or #hashtag.
+_MOVE = re.compile(
+    r"(?<![\w@#])(ta[şs]|ka[ğg][ıi]̇?t|makas|rock|paper|scissors)(?!\w)"
+)
+
+def fold(text):
+    """Lowercase and fold Turkish letters so "TAŞ", "taş" and "tas" compare equal."""
+    return text.lower().translate(_FOLD)
+
+def parse_move(text):
+    """Return the canonical move ("rock", "paper" or "scissors") in a mention, or None."""
+    return parse_move_word(text)[0]
+
+def parse_move_word(text):
+    """Return (canonical move, the word the player wrote for it) for a mention, or (None, None).
+
+    "makaslar" or "rocket" are not moves. Repeating the same move is fine;
+    a tweet naming two different moves is ambiguous and counts as no move.
+    """
+    move = word = None
+    for found_word in _MOVE.findall(text.lower()):
+        found = MOVES[fold(found_word)]
+        if found != move:
+            if move:
+                return None, None
+            move, word = found, found_word.replace("\u0307", "")
+    return move, word
@@ -0,0 +1,218 @@
+"""Per-endpoint rate limiting for X API calls.
+
+X reports the state of every rate-limit window in the x-rate-limit-limit,
+x-rate-limit-remaining and x-rate-limit-reset response headers. ApiDispatcher
+keeps one TokenBucket per endpoint from those headers and lets calls through
+in priority order while the endpoint still has calls left. call() blocks
+the calling thread; call_async() does the same for a coroutine without
+blocking the event loop, so threads and asyncio tasks share the buckets.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict
+
+import tweepy
+
+PRIORITY_HIGH = 0  # game results and match announcements
+PRIORITY_NORMAL = 1  # replies and user lookups
+PRIORITY_LOW = 2  # mention polling
+
+# Used when a 429 comes back without a reset header
+DEFAULT_BACKOFF_SECONDS = 60
+# How often an asyncio task waiting behind others in the queue checks its turn
+ASYNC_POLL_SECONDS = 0.01
+
+
+class RateLimited(Exception):
+    """Raised by ApiDispatcher.call(wait=False) when the endpoint has no calls left."""
+
+    def __init__(self, endpoint, wait_seconds):
+        super().__init__(f"{endpoint} rate limited for {wait_seconds:.0f}s")
+        self.endpoint = endpoint
+        self.wait_seconds = wait_seconds
+
+
+class TokenBucket:
+    """Calls left for one endpoint in the current window, refilled from response headers."""
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None  # None until X tells us
+        self.reset_at = 0.0
+
+    def available(self, now):
+        if now >= self.reset_at:
+            self.remaining = self.limit
+        return self.remaining is None or self.remaining > 0
+
+    def take(self):
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def wait_time(self, now):
+        return 0.0 if self.available(now) else max(self.reset_at - now, 0.0)
+
+    def update(self, headers, now):
+        if "x-rate-limit-remaining" not in headers:
+            return
+        if "x-rate-limit-limit" in headers:
+            self.limit = int(headers["x-rate-limit-limit"])
+        self.remaining = int(headers["x-rate-limit-remaining"])
+        self.reset_at = float(headers.get("x-rate-limit-reset", now + DEFAULT_BACKOFF_SECONDS))
+
+    def exhaust(self, reset_at):
+        self.remaining = 0
+        self.reset_at = reset_at
+
+
+class ApiDispatcher:
+    """Routes X API calls through per-endpoint token buckets.
+
+    Callers of the same endpoint queue by (priority, arrival); a call only
+    goes out when it is first in its queue and the bucket has a token left.
+    A 429 empties the bucket until its reset time and the call is retried.
+    """
+
+    def __init__(self, max_retries=3):
+        self.max_retries = max_retries
+        self.buckets = defaultdict(TokenBucket)
+        self._queues = defaultdict(list)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        # Per thread and per asyncio task, so concurrent calls don't see each other's headers
+        self._headers = contextvars.ContextVar("headers", default=None)
+        # Called as listener(endpoint, seconds, error) after every attempt; error is None on success
+        self.listeners = []
+
+    def attach(self, session):
+        """Record response headers of every request made through a requests.Session."""
+        session.hooks["response"].append(self._capture)
+
+    def observe(self, headers):
+        """Record the headers of the response to the call running on this thread or task."""
+        self._headers.set(headers)
+
+    def _capture(self, response, *args, **kwargs):
+        self.observe(response.headers)
+
+    def wait_time(self, endpoint):
+        with self._cond:
+            return self.buckets[endpoint].wait_time(time.time())
+
+    def call(self, endpoint, fn, *args, priority=PRIORITY_NORMAL, wait=True, **kwargs):
+        """Call fn(*args, **kwargs) once the endpoint allows it.
+
+        With wait=False, raise RateLimited instead of waiting for the window to reset.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire(endpoint, priority, wait)
+            self._headers.set(None)
+            start = time.perf_counter()
+            error = None
+            try:
+                return fn(*args, **kwargs)
+            except tweepy.TooManyRequests as e:
+                error = e
+                self._rate_limited(endpoint, e, wait, attempt)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._finish(endpoint, start, error)
+
+    async def call_async(self, endpoint, fn, *args, priority=PRIORITY_NORMAL, wait=True, limit=None, **kwargs):
+        """call() for a coroutine function fn; waiting for the endpoint doesn't block the event loop.
+
+        limit is an optional asyncio.Semaphore bounding the calls in flight. A
+        slot is only taken once the endpoint has let the call through, so calls
+        waiting out a rate limit don't hold slots that other endpoints need.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_async(endpoint, priority, wait)
+            async with limit if limit is not None else contextlib.nullcontext():
+                self._headers.set(None)
+                start = time.perf_counter()
+                error = None
+                try:
+                    return await fn(*args, **kwargs)
+                except tweepy.TooManyRequests as e:
+                    error = e
+                    self._rate_limited(endpoint, e, wait, attempt)
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    self._finish(endpoint, start, error)
+
+    def _rate_limited(self, endpoint, error, wait, attempt):
+        """Empty the bucket after a 429, and re-raise unless the call should be retried."""
+        with self._cond:
+            reset_at = error.reset_time or time.time() + DEFAULT_BACKOFF_SECONDS
+            self.buckets[endpoint].exhaust(reset_at)
+        if not wait:
+            raise RateLimited(endpoint, reset_at - time.time()) from error
+        if attempt == self.max_retries:
+            raise error
+
+    def _finish(self, endpoint, start, error):
+        headers = self._headers.get()
+        if headers is not None:
+            with self._cond:
+                self.buckets[endpoint].update(headers, time.time())
+                self._cond.notify_all()
+        for listener in self.listeners:
+            listener(endpoint, time.perf_counter() - start, error)
+
+    def _acquire(self, endpoint, priority, wait):
+        entry = (priority, next(self._seq))
+        with self._cond:
+            queue = self._queues[endpoint]
+            bucket = self.buckets[endpoint]
+            heapq.heappush(queue, entry)
+            try:
+                while True:
+                    now = time.time()
+                    if queue[0] == entry:
+                        wait_seconds = bucket.wait_time(now)
+                        if wait_seconds <= 0:
+                            bucket.take()
+                            return
+                        if not wait:
+                            raise RateLimited(endpoint, wait_seconds)
+                        self._cond.wait(wait_seconds)
+                    elif not wait and bucket.wait_time(now) > 0:
+                        raise RateLimited(endpoint, bucket.wait_time(now))
+                    else:
+                        self._cond.wait()
+            finally:
+                queue.remove(entry)
+                heapq.heapify(queue)
+                self._cond.notify_all()
+
+    async def _acquire_async(self, endpoint, priority, wait):
+        entry = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queues[endpoint], entry)
+        try:
+            while True:
+                with self._cond:
+                    queue = self._queues[endpoint]
+                    wait_seconds = self.buckets[endpoint].wait_time(time.time())
+                    if queue[0] == entry and wait_seconds <= 0:
+                        self.buckets[endpoint].take()
+                        return
+                    if not wait and wait_seconds > 0:
+                        raise RateLimited(endpoint, wait_seconds)
+                # A response can refill the bucket early, so don't sleep through a whole reset
+                await asyncio.sleep(min(wait_seconds, 1.0) if queue[0] == entry else ASYNC_POLL_SECONDS)
+        finally:
+            with self._cond:
+                queue = self._queues[endpoint]
+                queue.remove(entry)
+                heapq.heapify(queue)
+                self._cond.notify_all()
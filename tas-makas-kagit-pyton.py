@@ -2,48 +2,176 @@ import tweepy
 import sqlite3
 import datetime
 import re
-from flask import Flask, render_template_string
-from threading import Thread
-import schedule
+import json
+from flask import Blueprint, Flask, Response, abort, jsonify, render_template_string, request, g
+from threading import Thread, Event, Lock, local
+import hashlib
+import base64
+from contextlib import contextmanager
 import time
+import asyncio
+import queue
 import os
+import sys
+from collections import namedtuple
+import eventlog
+import metrics
+from moves import parse_move_word
+from export import export_rows, fetch_chunks
+from leaderboard import Leaderboard, Player, RANKINGS, win_rate
+from matchqueue import MatchQueue, Entry
+from timers import Timer, Timers, next_utc
+from xapi import AsyncFakeX, AsyncV2Backend, FakeX, V1Backend, V2Backend, V2MentionStream
+from ratelimit import ApiDispatcher, RateLimited, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
 
-# Flask app for leaderboard
-app = Flask(__name__)
-
-print("Script starting...")
-print("Loading environment variables...")
-# X API credentials (Replit environment variables)
-consumer_key = os.getenv("CONSUMER_KEY")
-consumer_secret = os.getenv("CONSUMER_SECRET")
-access_token = os.getenv("ACCESS_TOKEN")
-access_token_secret = os.getenv("ACCESS_TOKEN_SECRET")
-print(f"Consumer Key: {consumer_key[:5]}...")
-print(f"Access Token starts with: {access_token.split('-')[0]}...")
-
-# Tweepy v2 Client setup
-client = tweepy.Client(
-    consumer_key=consumer_key,
-    consumer_secret=consumer_secret,
-    access_token=access_token,
-    access_token_secret=access_token_secret
-)
-
-# Test Tweepy connection
-print("Attempting to verify Tweepy credentials...")
-try:
-    user = client.get_me().data
-    print(f"Tweepy connected successfully! Bot username: {user.username}, User ID: {user.id}")
-except Exception as e:
-    print(f"Tweepy connection failed: {str(e)}")
+log = eventlog.get("bot")
+# High-volume events keep one in N; LOG_SAMPLE="event=N,..." overrides
+LOG_SAMPLE_RATES = {"mention_received": 1, "language_set": 100, "not_eligible": 10, "waiting_for_opponent": 10,
+                    **eventlog.parse_sample_rates(os.getenv("LOG_SAMPLE", ""))}
+
+# Leaderboard pages and API, served by the app from create_app()
+web = Blueprint("leaderboard", __name__)
+
+# X API backend (see xapi.py), built on first use so that importing this module never touches the network
+X_BACKEND = os.getenv("X_BACKEND", "v2")  # v2, v1 or fake
+X_BACKENDS = {"v2": V2Backend, "v1": V1Backend}
+X_CREDENTIALS = ("CONSUMER_KEY", "CONSUMER_SECRET", "ACCESS_TOKEN", "ACCESS_TOKEN_SECRET")
+_x = {"backend": None, "async_backend": None, "me": None}
+_x_lock = Lock()
+
+# Every X API call goes through the dispatcher, which tracks the rate limit of each endpoint
+api = ApiDispatcher()
+
+POLL_INTERVAL_SECONDS = 60
+
+BotUser = namedtuple("BotUser", ["id", "username"])
+
+def x_backend():
+    """The X backend chosen by X_BACKEND, created on first use."""
+    with _x_lock:
+        if _x["backend"] is None:
+            backend = FakeX() if X_BACKEND == "fake" else X_BACKENDS[X_BACKEND](*_x_credentials())
+            backend.attach(api)
+            _x["backend"] = backend
+        return _x["backend"]
+
+def x_async_backend():
+    """The X backend as coroutines, for the asyncio runtime: AsyncV2Backend, or AsyncFakeX over the FakeX."""
+    if _x["async_backend"] is None:
+        if X_BACKEND == "v2" and not isinstance(_x["backend"], FakeX):
+            backend = AsyncV2Backend(*_x_credentials())
+            backend.attach(api)
+        elif isinstance(x_backend(), FakeX):
+            # The FakeX already reports to the dispatcher
+            backend = AsyncFakeX(x_backend())
+        else:
+            raise RuntimeError(f"The asyncio runtime needs X_BACKEND=v2 or fake, not {X_BACKEND}")
+        _x["async_backend"] = backend
+    return _x["async_backend"]
+
+def x_mention_stream():
+    """A new MentionStream: the FakeX stand-in, or the v2 filtered stream, which needs BEARER_TOKEN."""
+    backend = x_backend()
+    if isinstance(backend, FakeX):
+        return backend.stream()
+    if not os.getenv("BEARER_TOKEN"):
+        raise RuntimeError("INGEST_MODE=stream needs BEARER_TOKEN for the filtered stream")
+    return V2MentionStream(os.getenv("BEARER_TOKEN"))
+
+def _x_credentials():
+    missing = [name for name in X_CREDENTIALS if not os.getenv(name)]
+    if missing:
+        raise RuntimeError(f"Missing X API credentials: {', '.join(missing)}")
+    return [os.getenv(name) for name in X_CREDENTIALS]
+
+def use_backend(backend):
+    """Talk to X through the given backend from now on, e.g. a FakeX in tools and load tests."""
+    with _x_lock:
+        backend.attach(api)
+        _x.update(backend=backend, async_backend=None, me=None)
+
+def bot_identity():
+    """The bot's own account, from settings; asked from X only the first time ever."""
+    if _x["me"] is None:
+        cached = dict(db().execute(
+            "SELECT key, value FROM settings WHERE key IN ('bot_user_id', 'bot_username')"
+        ).fetchall())
+        if len(cached) == 2:
+            me = BotUser(cached["bot_user_id"], cached["bot_username"])
+        else:
+            account = api.call("me", x_backend().me)
+            me = BotUser(account.id, account.username)
+            db().executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                             [("bot_user_id", me.id), ("bot_username", me.username)])
+            log.info("bot_identity_fetched", user_id=me.id, username=me.username)
+        _x["me"] = me
+    return _x["me"]
 
 # SQLite setup
-conn = sqlite3.connect("rps_game.db", check_same_thread=False)
-cursor = conn.cursor()
+# Every thread (and every Flask request) gets its own connection. WAL lets the
+# leaderboard read while the bot writes, and writes go through transaction().
+DB_PATH = os.getenv("DB_PATH", "rps_game.db")
+DB_BUSY_TIMEOUT_SECONDS = 30
+_thread_db = local()
 
-# Veritabanını başlat
-def init_db():
-    cursor.executescript("""
+def connect():
+    """Open a new connection; statements autocommit unless run inside transaction()."""
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def db():
+    """This thread's connection."""
+    conn = getattr(_thread_db, "conn", None)
+    if conn is None:
+        conn = _thread_db.conn = connect()
+    return conn
+
+@contextmanager
+def transaction():
+    """Run the block as one write transaction on this thread's connection.
+
+    Nested blocks become savepoints, so an inner failure only rolls back its own writes.
+    """
+    conn = db()
+    if conn.in_transaction:
+        savepoint = f"sp_{id(conn)}_{time.monotonic_ns()}"
+        conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+            raise
+        conn.execute(f"RELEASE {savepoint}")
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def request_db():
+    """Read connection for the current Flask request, closed when the request ends."""
+    if "db" not in g:
+        g.db = connect()
+    return g.db
+
+@web.teardown_app_request
+def close_request_db(exception):
+    conn = g.pop("db", None)
+    if conn is not None:
+        conn.close()
+
+# Schema migrations, applied in order at startup. PRAGMA user_version holds the
+# number of the last one applied. Never edit a migration once it has shipped,
+# add a new one instead.
+MIGRATIONS = [
+    # 1: original schema
+    """
     CREATE TABLE IF NOT EXISTS users (
         user_id TEXT PRIMARY KEY,
         username TEXT,
@@ -75,81 +203,555 @@ def init_db():
         value TEXT
     );
     INSERT OR IGNORE INTO settings (key, value) VALUES ('last_mention_id', '0');
-    """)
-    conn.commit()
+    """,
+    # 2: X profile cache
+    """
+    CREATE TABLE IF NOT EXISTS profiles (
+        user_id TEXT PRIMARY KEY,
+        username TEXT,
+        created_at TEXT,
+        tweet_count INTEGER,
+        tweet_count_checked TEXT,
+        description TEXT,
+        description_checked TEXT,
+        recheck_after TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_profiles_username ON profiles(lower(username));
+    """,
+    # 3: ingested mentions
+    """
+    CREATE TABLE IF NOT EXISTS mentions (
+        mention_id INTEGER PRIMARY KEY,
+        author_id TEXT,
+        text TEXT,
+        created_at TEXT,
+        entities TEXT
+    );
+    INSERT OR IGNORE INTO settings (key, value) VALUES ('last_processed_mention_id', '0');
+    """,
+    # 4: moves recorded at ingestion
+    """
+    CREATE TABLE IF NOT EXISTS moves (
+        game_id TEXT,
+        user_id TEXT,
+        choice TEXT,
+        mention_id INTEGER,
+        created_at TEXT,
+        PRIMARY KEY (game_id, user_id)
+    );
+    """,
+    # 5: outbound tweet outbox
+    """
+    CREATE TABLE IF NOT EXISTS outbox (
+        outbox_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT UNIQUE,
+        text TEXT,
+        in_reply_to TEXT,
+        priority INTEGER,
+        status TEXT,
+        attempts INTEGER DEFAULT 0,
+        next_attempt_at TEXT,
+        tweet_id TEXT,
+        last_error TEXT,
+        created_at TEXT
+    );
+    """,
+    # 6: users.status for matchmaking, indexes for the hot queries
+    """
+    ALTER TABLE users ADD COLUMN status TEXT DEFAULT '';
+    CREATE INDEX idx_users_status ON users(status);
+    CREATE INDEX idx_users_wins ON users(wins DESC);
+    CREATE INDEX idx_games_status_deadline ON games(status, deadline);
+    CREATE INDEX idx_games_user1 ON games(user1_id);
+    CREATE INDEX idx_games_user2 ON games(user2_id);
+    CREATE INDEX idx_outbox_due ON outbox(status, priority, outbox_id);
+    """,
+    # 7: random matchmaking queue, replaces users.status='waiting'
+    """
+    CREATE TABLE match_queue (
+        user_id TEXT PRIMARY KEY,
+        username TEXT,
+        language TEXT,
+        band INTEGER,
+        enqueued_at REAL,
+        mention_id INTEGER
+    );
+    INSERT INTO match_queue (user_id, username, language, band, enqueued_at)
+        SELECT user_id, username, COALESCE(language, 'en'), 0, strftime('%s', 'now') FROM users WHERE status='waiting';
+    UPDATE users SET status='' WHERE status='waiting';
+    """,
+    # 8: keyset pagination for /api/leaderboard, one index per sort order
+    """
+    CREATE INDEX idx_users_rank_wins ON users(wins DESC, bsc_balance DESC, user_id) WHERE games_played>0;
+    CREATE INDEX idx_users_rank_balance ON users(bsc_balance DESC, wins DESC, user_id) WHERE games_played>0;
+    CREATE INDEX idx_users_rank_win_rate ON users(wins * 1.0 / games_played DESC, wins DESC, user_id)
+        WHERE games_played>0;
+    """,
+    # 9: daily rollups, updated with each settlement
+    """
+    CREATE TABLE user_daily_stats (
+        user_id TEXT,
+        day TEXT,
+        games INTEGER DEFAULT 0,
+        wins INTEGER DEFAULT 0,
+        draws INTEGER DEFAULT 0,
+        no_shows INTEGER DEFAULT 0,
+        payout REAL DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_user_daily_stats_day ON user_daily_stats(day, user_id);
+    CREATE TABLE daily_stats (
+        day TEXT PRIMARY KEY,
+        games INTEGER DEFAULT 0,
+        no_shows INTEGER DEFAULT 0,
+        draws INTEGER DEFAULT 0,
+        payouts REAL DEFAULT 0
+    );
+    """,
+    # 10: timers (game settlements and recurring jobs), loaded into the timer heap at startup
+    """
+    CREATE TABLE timers (
+        key TEXT PRIMARY KEY,
+        kind TEXT,
+        due REAL,
+        arg TEXT
+    );
+    """,
+    # 11: games created per user and UTC day, replacing users.games_today/last_game_date
+    """
+    CREATE TABLE daily_usage (
+        user_id TEXT,
+        day TEXT,
+        games INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_daily_usage_day ON daily_usage(day);
+    INSERT INTO daily_usage (user_id, day, games)
+        SELECT user_id, last_game_date, games_today FROM users WHERE last_game_date IS NOT NULL AND games_today>0;
+    DELETE FROM timers WHERE key='reset_daily_limits';
+    """,
+    # 12: outcome of every handled mention, so a replayed mention is skipped
+    """
+    CREATE TABLE processed_mentions (
+        mention_id INTEGER PRIMARY KEY,
+        outcome TEXT NOT NULL,
+        processed_at TEXT
+    );
+    INSERT INTO processed_mentions (mention_id, outcome)
+        SELECT mention_id, 'before_migration' FROM mentions
+        WHERE mention_id <= (SELECT CAST(value AS INTEGER) FROM settings WHERE key='last_processed_mention_id');
+    """,
+    # 13: at most one pending game per pair of players; older duplicates are cancelled, keeping the first
+    """
+    UPDATE games SET status='cancelled' WHERE status='pending' AND rowid NOT IN (
+        SELECT MIN(rowid) FROM games WHERE status='pending' GROUP BY min(user1_id, user2_id), max(user1_id, user2_id)
+    );
+    DELETE FROM timers WHERE kind='settle' AND arg IN (SELECT game_id FROM games WHERE status='cancelled');
+    CREATE UNIQUE INDEX idx_games_pending_pair ON games(min(user1_id, user2_id), max(user1_id, user2_id))
+        WHERE status='pending';
+    """,
+    # 14: the word a player wrote for their move (e.g. "taş"), shown in the result tweet
+    """
+    ALTER TABLE moves ADD COLUMN word TEXT;
+    """,
+    # 15: the author's username as X returned it with the mention, to reply to if their lookup finds nothing
+    """
+    ALTER TABLE mentions ADD COLUMN author_username TEXT;
+    """,
+]
+
+def migrate(conn):
+    """Apply every migration newer than the database's user_version."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, script in enumerate(MIGRATIONS, 1):
+        if number <= version:
+            continue
+        log.info("migration_applying", migration=number)
+        try:
+            conn.executescript(f"BEGIN IMMEDIATE; {script}; PRAGMA user_version={number}; COMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+# Queries on the hot paths and the index each one must use (see check_query_plans)
+HOT_QUERIES = {
+    "pending_games": ("SELECT game_id, deadline FROM games WHERE status='pending'", (),
+                      "idx_games_status_deadline"),
+    "record_move": ("SELECT game_id FROM games WHERE status='pending' AND (user1_id=? OR user2_id=?) "
+                    "AND deadline<=? AND deadline>=?", ("", "", "", ""), "idx_games_status_deadline"),
+    "daily_usage": ("SELECT games FROM daily_usage WHERE user_id=? AND day=?", ("", ""), "PRIMARY KEY"),
+    "unprocessed_mentions": ("SELECT m.mention_id FROM mentions m LEFT JOIN processed_mentions p "
+                             "ON p.mention_id=m.mention_id WHERE m.mention_id>? AND p.mention_id IS NULL "
+                             "ORDER BY m.mention_id", (0,), "INTEGER PRIMARY KEY"),
+    "outbox_claim": ("SELECT outbox_id FROM outbox WHERE status='pending' AND next_attempt_at<=? "
+                     "ORDER BY priority, outbox_id LIMIT 1", ("",), "idx_outbox_due"),
+}
+
+def check_query_plans(conn):
+    """Return a list of hot queries whose EXPLAIN QUERY PLAN doesn't use their index."""
+    problems = []
+    for name, (sql, params, index) in HOT_QUERIES.items():
+        plan = " / ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        if index not in plan or "TEMP B-TREE" in plan:
+            problems.append(f"{name}: {plan}")
+    return problems
+
+# Veritabanını başlat
+def init_db():
+    migrate(db())
+    load_match_queue()
+    load_leaderboard()
+    load_timers()
 
 # Pinned tweet URL
 PINNED_TWEET_URL = "https://t.co/3gB7kLhXvY"  # Shortened form of https://x.com/apsnygame/status/1912182385262629239
 
 # Game logic
-CHOICES = {"taş": "rock", "kağıt": "paper", "makas": "scissors"}
 WIN_MATRIX = {
     "rock": "scissors",
     "paper": "rock",
     "scissors": "paper"
 }
+MOVE_WINDOW_SECONDS = 1  # a move counts only if tweeted within this long after the deadline
+
+USER_LOOKUP_BATCH = 100  # X API v2 users lookup limit per request
+MIN_ACCOUNT_AGE_DAYS = 30
+MIN_TWEET_COUNT = 10
+DAILY_GAME_LIMIT = 10
+
+# Profile cache: seconds before a cached tweet_count/description is looked up again
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "86400"))
+
+Profile = namedtuple("Profile", ["id", "username", "created_at", "tweet_count", "description"])
+
+def _profile_from_row(row):
+    user_id, username, created_at, tweet_count, description = row[:5]
+    return Profile(user_id, username, datetime.datetime.fromisoformat(created_at), tweet_count, description)
+
+def _profile_is_fresh(row, fields, now):
+    """A cached row is fresh if every field we need was checked within the TTL,
+    or if the account was rejected as too young and can't have become eligible yet."""
+    checked = {"tweet_count": row[5], "description": row[6]}
+    recheck_after = row[7]
+    if recheck_after and recheck_after > now.isoformat():
+        return True
+    cutoff = (now - datetime.timedelta(seconds=PROFILE_CACHE_TTL)).isoformat()
+    return all(checked[field] and checked[field] >= cutoff for field in fields)
 
-def check_user_eligibility(user_id, username):
-    """Check if user meets manipulation criteria."""
-    cursor.execute("SELECT * FROM users WHERE user_id=?", (user_id,))
-    user = cursor.fetchone()
+def _cache_profiles(users, now):
+    checked = now.isoformat()
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO profiles (user_id, username, created_at, tweet_count, tweet_count_checked, "
+            "description, description_checked) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET username=excluded.username, created_at=excluded.created_at, "
+            "tweet_count=excluded.tweet_count, tweet_count_checked=excluded.tweet_count_checked, "
+            "description=excluded.description, description_checked=excluded.description_checked",
+            [(x_user.id, x_user.username, x_user.created_at.isoformat(), x_user.tweet_count,
+              checked, x_user.description, checked) for x_user in users]
+        )
+
+def resolve_users(user_ids=(), usernames=()):
+    """Resolve X users in bulk, returns (by_id, by_username, unresolved).
+
+    by_id and by_username are dicts of Profile. Authors need tweet_count and
+    description, invited users only tweet_count. Fresh entries come from the
+    profiles cache, the rest from get_users (100 per call). Stale entries are
+    still used if the API lookup fails; the IDs and lowercased usernames that
+    failed with nothing cached are in unresolved, as they may well exist.
+    """
+    now = datetime.datetime.utcnow()
+    by_id, by_username, stale_ids, stale_names = _cached_profiles(user_ids, usernames, now)
+    failed_ids, failed_names = set(), set()
+    for keys in _lookup_batches(stale_ids):
+        users = _fetch_users("ids", keys)
+        if users is None:
+            failed_ids.update(keys)
+        _add_profiles(by_id, by_username, users, now)
+    for keys in _lookup_batches(stale_names - {by_id[i].username.lower() for i in stale_ids if i in by_id}):
+        users = _fetch_users("usernames", keys)
+        if users is None:
+            failed_names.update(keys)
+        _add_profiles(by_id, by_username, users, now)
+    return by_id, by_username, _unresolved(by_id, by_username, failed_ids, failed_names)
+
+def _unresolved(by_id, by_username, failed_ids, failed_names):
+    return {i for i in failed_ids if i not in by_id} | {n for n in failed_names if n not in by_username}
+
+def _cached_profiles(user_ids, usernames, now):
+    """Cached profiles as (by_id, by_username), plus the sets of IDs and usernames to look up on X."""
+    by_id, by_username = {}, {}
+    stale_ids, stale_names = set(), set()
+    columns = ("SELECT user_id, username, created_at, tweet_count, description, "
+               "tweet_count_checked, description_checked, recheck_after FROM profiles ")
+
+    def lookup(keys, where, key_of, fields, stale):
+        for chunk in _lookup_batches(keys):
+            found = set()
+            for row in db().execute(columns + where.format(",".join("?" * len(chunk))), chunk).fetchall():
+                _add_profiles(by_id, by_username, [_profile_from_row(row)])
+                found.add(key_of(row))
+                if not _profile_is_fresh(row, fields, now):
+                    stale.add(key_of(row))
+            stale.update(set(chunk) - found)
+
+    lookup({str(i) for i in user_ids}, "WHERE user_id IN ({})", lambda row: row[0],
+           ("tweet_count", "description"), stale_ids)
+    lookup({n.lower() for n in usernames} - set(by_username), "WHERE lower(username) IN ({})",
+           lambda row: row[1].lower(), ("tweet_count",), stale_names)
+    return by_id, by_username, stale_ids, stale_names
+
+def _lookup_batches(keys):
+    keys = sorted(keys)
+    return [keys[i:i + USER_LOOKUP_BATCH] for i in range(0, len(keys), USER_LOOKUP_BATCH)]
+
+def _fetch_users(param, keys):
+    """Users found for keys, or None if the lookup failed (not the same as none of them existing)."""
+    try:
+        return api.call("users", x_backend().users, **{param: keys})
+    except Exception as e:
+        log.error("user_lookup_failed", by=param, count=len(keys), error=str(e))
+        return None
+
+def _add_profiles(by_id, by_username, users, now=None):
+    """Add users to the lookup dicts; with now, they were just fetched and go into the cache too."""
+    if not users:
+        return
+    if now is not None:
+        _cache_profiles(users, now)
+    for user in users:
+        profile = Profile(*user)
+        by_id[str(profile.id)] = profile
+        by_username[profile.username.lower()] = profile
+
+def check_user_eligibility(user_id, username, profile):
+    """Check if user meets manipulation criteria; writes are committed by the caller."""
+    conn = db()
+    user = conn.execute("SELECT * FROM users WHERE user_id=?", (user_id,)).fetchone()
     
     if user and user[7] >= 2:  # no_shows >= 2
         if user[8] or (user[9] and user[9] > datetime.datetime.utcnow().isoformat()):
             return False, f"2 kere katılmadın, 7 gün ban. Detay: [{PINNED_TWEET_URL}]. $BSC"
     
+    if profile is None:
+        return False, f"@{username}, hata: X hesabı bulunamadı. DM @apsnygame. $BSC"
+    
     try:
-        x_user = client.get_user(id=user_id, user_fields=["created_at", "public_metrics"]).data
-        created_at = datetime.datetime.strptime(x_user.created_at.strftime("%Y-%m-%d"), "%Y-%m-%d")
+        created_at = datetime.datetime.strptime(profile.created_at.strftime("%Y-%m-%d"), "%Y-%m-%d")
         age_days = (datetime.datetime.utcnow() - created_at).days
-        tweet_count = x_user.public_metrics["tweet_count"]
+        tweet_count = profile.tweet_count
         
-        if age_days < 30 or tweet_count < 10:
-            return False, f"@{username}, şartlar: hesap >1 ay, tweet >10. Detay: [{PINNED_TWEET_URL}]. $BSC"
+        if age_days < MIN_ACCOUNT_AGE_DAYS:
+            # Negative cache: nothing can change before the account is old enough
+            conn.execute(
+                "UPDATE profiles SET recheck_after=? WHERE user_id=?",
+                ((created_at + datetime.timedelta(days=MIN_ACCOUNT_AGE_DAYS)).isoformat(), user_id)
+            )
         
-        cursor.execute("SELECT games_today, last_game_date FROM users WHERE user_id=?", (user_id,))
-        games_today, last_date = cursor.fetchone() or (0, None)
-        today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+        if age_days < MIN_ACCOUNT_AGE_DAYS or tweet_count < MIN_TWEET_COUNT:
+            return False, f"@{username}, şartlar: hesap >1 ay, tweet >10. Detay: [{PINNED_TWEET_URL}]. $BSC"
         
-        if last_date != today:
-            games_today = 0
+        games_today = conn.execute(
+            "SELECT games FROM daily_usage WHERE user_id=? AND day=?",
+            (user_id, datetime.datetime.utcnow().strftime("%Y-%m-%d"))
+        ).fetchone()
         
-        if games_today >= 10:
-            return False, f"@{username}, günlük 10 oyun sınırı. Yarın bekleriz! $BSC"
+        if games_today and games_today[0] >= DAILY_GAME_LIMIT:
+            return False, f"@{username}, günlük {DAILY_GAME_LIMIT} oyun sınırı. Yarın bekleriz! $BSC"
         
         if not user:
-            cursor.execute(
-                "INSERT INTO users (user_id, username, language, created_at, tweet_count, games_today, last_game_date) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (user_id, username, "en", x_user.created_at.isoformat(), tweet_count, 0, today)
+            conn.execute(
+                "INSERT INTO users (user_id, username, language, created_at, tweet_count) VALUES (?, ?, ?, ?, ?)",
+                (user_id, username, "en", profile.created_at.isoformat(), tweet_count)
             )
-            conn.commit()
         
         return True, ""
     except Exception as e:
         return False, f"@{username}, hata: {str(e)}. DM @apsnygame. $BSC"
 
-def detect_language(text, username):
+def detect_language(text, profile):
     """Detect language from tweet or bio."""
     if re.search(r"[çğıöşüÇĞİÖŞÜ]", text):
         return "tr"
-    try:
-        user = client.get_user(username=username, user_fields=["description"]).data
-        if re.search(r"[çğıöşüÇĞİÖŞÜ]", user.description):
-            return "tr"
-    except:
-        pass
+    if profile is not None and re.search(r"[çğıöşüÇĞİÖŞÜ]", profile.description or ""):
+        return "tr"
     return "en"
 
+# Random matchmaking
+# Skill bands split waiting players by win rate; 1 band means no skill matching
+MATCH_SKILL_BANDS = int(os.getenv("MATCH_SKILL_BANDS", "1"))
+MATCH_QUEUE_MAX_WAIT_SECONDS = 24 * 3600
+matchmaking = MatchQueue(bands=MATCH_SKILL_BANDS, max_wait=MATCH_QUEUE_MAX_WAIT_SECONDS)
+
+def load_match_queue():
+    """Rebuild the in-memory queue from the match_queue table."""
+    rows = db().execute(
+        "SELECT user_id, username, language, band, enqueued_at, mention_id FROM match_queue"
+    ).fetchall()
+    matchmaking.load(Entry(*row) for row in rows)
+
+def find_random_opponent(user_id, username, language, mention_id):
+    """Pair the user with a waiting player, or queue them. Returns the opponent Entry or None."""
+    conn = db()
+    wins, games_played = conn.execute(
+        "SELECT wins, games_played FROM users WHERE user_id=?", (user_id,)
+    ).fetchone()
+    entry = Entry(user_id, username, language, matchmaking.band_for(wins, games_played), time.time(), mention_id)
+    opponent = matchmaking.pair(entry, entry.enqueued_at)
+    if opponent:
+        conn.execute("DELETE FROM match_queue WHERE user_id IN (?, ?)", (user_id, opponent.user_id))
+        matchmaking.remove(user_id)
+        return opponent
+    queue_player(entry)
+    return None
+
+def queue_player(entry):
+    matchmaking.add(entry)
+    db().execute(
+        "INSERT OR REPLACE INTO match_queue (user_id, username, language, band, enqueued_at, mention_id) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        entry
+    )
+
+def expire_match_queue():
+    """Drop players who waited too long for a random opponent and tell them."""
+    expired = matchmaking.expire(time.time())
+    if not expired:
+        return
+    with transaction() as conn:
+        for entry in expired:
+            conn.execute("DELETE FROM match_queue WHERE user_id=?", (entry.user_id,))
+            if entry.language == "tr":
+                text = f"@{entry.username} rakip bulunamadı, tekrar dene! [{PINNED_TWEET_URL}]. $BSC"
+            else:
+                text = f"@{entry.username} no opponent found, try again! [{PINNED_TWEET_URL}]. $BSC"
+            enqueue_tweet(f"expired:{entry.user_id}:{entry.enqueued_at:.0f}", text, in_reply_to=entry.mention_id)
+    log.info("match_queue_expired", players=len(expired))
+
+# Outbound tweets
+# Tweets are written to the outbox in the same transaction as the state change
+# they announce and posted by background senders, so a slow or failing post
+# never holds up game state and a restart never loses an announcement.
+OUTBOX_WORKERS = 2
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_BACKOFF_SECONDS = 30  # doubled after every failed attempt
+OUTBOX_IDLE_SECONDS = 5
+outbox_wakeup = Event()
+
+OutboxTweet = namedtuple("OutboxTweet", ["outbox_id", "key", "text", "in_reply_to", "priority", "attempts"])
+
+def enqueue_tweet(key, text, in_reply_to=None, priority=PRIORITY_NORMAL):
+    """Queue a tweet; the caller commits. A key that was already queued is ignored."""
+    now = datetime.datetime.utcnow().isoformat()
+    db().execute(
+        "INSERT OR IGNORE INTO outbox (idempotency_key, text, in_reply_to, priority, status, next_attempt_at, created_at) "
+        "VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+        (key, text, str(in_reply_to) if in_reply_to else None, priority, now, now)
+    )
+    outbox_wakeup.set()
+
+def _claim_outbox_tweet():
+    now = datetime.datetime.utcnow().isoformat()
+    with transaction() as conn:
+        rows = conn.execute(
+            "UPDATE outbox SET status='sending', attempts=attempts+1 WHERE outbox_id=("
+            "SELECT outbox_id FROM outbox WHERE status='pending' AND next_attempt_at<=? "
+            "ORDER BY priority, outbox_id LIMIT 1) "
+            "RETURNING outbox_id, idempotency_key, text, in_reply_to, priority, attempts",
+            (now,)
+        ).fetchall()
+    return OutboxTweet(*rows[0]) if rows else None
+
+def send_outbox_tweet():
+    """Post the next due outbox tweet. Returns False if there was nothing to send."""
+    tweet = _claim_outbox_tweet()
+    if not tweet:
+        return False
+    log.debug("tweet_posting", key=tweet.key, text=tweet.text)
+    try:
+        tweet_id = api.call("tweets", x_backend().post, tweet.text, tweet.in_reply_to, priority=tweet.priority)
+    except Exception as e:
+        return _outbox_posted(tweet, error=e)
+    return _outbox_posted(tweet, tweet_id)
+
+def _outbox_posted(tweet, tweet_id=None, error=None):
+    """Record the outcome of posting a claimed tweet."""
+    if isinstance(error, tweepy.Forbidden) and "duplicate" in str(error).lower():
+        if tweet.attempts > 1:
+            # An earlier attempt went out before a crash or restart, X refuses the same text twice
+            error = None
+        else:
+            # Another row with the same text went out; this one never will
+            log.warning("tweet_duplicate", key=tweet.key, error=str(error))
+            OUTBOX_FAILURES.labels("true").inc()
+            db().execute("UPDATE outbox SET status='duplicate', last_error=? WHERE outbox_id=?",
+                         (str(error), tweet.outbox_id))
+            return True
+    if error is not None:
+        return _outbox_failed(tweet.outbox_id, tweet.key, tweet.attempts, error)
+    db().execute("UPDATE outbox SET status='sent', tweet_id=?, last_error=NULL WHERE outbox_id=?",
+                 (tweet_id, tweet.outbox_id))
+    return True
+
+def _outbox_failed(outbox_id, key, attempts, error):
+    log.warning("tweet_failed", key=key, attempt=attempts, error=str(error))
+    OUTBOX_FAILURES.labels("true" if attempts >= OUTBOX_MAX_ATTEMPTS else "false").inc()
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        db().execute("UPDATE outbox SET status='failed', last_error=? WHERE outbox_id=?", (str(error), outbox_id))
+    else:
+        retry_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1))
+        db().execute("UPDATE outbox SET status='pending', next_attempt_at=?, last_error=? WHERE outbox_id=?",
+                     (retry_at.isoformat(), str(error), outbox_id))
+    return True
+
+def run_outbox_sender():
+    while True:
+        try:
+            if send_outbox_tweet():
+                continue
+        except Exception:
+            log.exception("outbox_sender_error")
+        outbox_wakeup.wait(OUTBOX_IDLE_SECONDS)
+        outbox_wakeup.clear()
+
+def requeue_interrupted_tweets():
+    # A tweet still marked 'sending' was interrupted by a restart; X rejects it if it did go out
+    db().execute("UPDATE outbox SET status='pending' WHERE status='sending'")
+
+def start_outbox_senders():
+    requeue_interrupted_tweets()
+    for _ in range(OUTBOX_WORKERS):
+        Thread(target=run_outbox_sender, daemon=True).start()
+
+GAME_ID_SEQUENCE = 10000  # IDs per millisecond before the sequence borrows from the next one
+
+def next_game_id(conn):
+    """A new game ID, game_<milliseconds>_<sequence>; IDs sort in the order they were issued.
+
+    The last issued value lives in settings and is bumped in the caller's
+    write transaction, so IDs never repeat across threads or processes, and
+    stay increasing if the clock steps back.
+    """
+    now = int(time.time() * 1000) * GAME_ID_SEQUENCE
+    value = conn.execute(
+        "INSERT INTO settings (key, value) VALUES ('last_game_id', ?) "
+        "ON CONFLICT(key) DO UPDATE SET value=MAX(CAST(value AS INTEGER) + 1, CAST(excluded.value AS INTEGER)) "
+        "RETURNING value",
+        (now,)
+    ).fetchone()[0]
+    millis, sequence = divmod(int(value), GAME_ID_SEQUENCE)
+    return f"game_{millis}_{sequence:04d}"
+
 def create_match(user1_id, user1_name, user2_id, user2_name):
-    """Create a match and post tweet."""
-    game_id = f"game_{int(time.time())}"
+    """Create a match and queue its announcement. Returns the game_id, or None on failure."""
+    game_id = None
     deadline = (datetime.datetime.utcnow() + datetime.timedelta(hours=1)).replace(
         hour=17, minute=0, second=0, microsecond=0
     ).isoformat()
     
-    lang1 = cursor.execute("SELECT language FROM users WHERE user_id=?", (user1_id,)).fetchone()[0]
-    lang2 = cursor.execute("SELECT language FROM users WHERE user_id=?", (user2_id,)).fetchone()[0]
+    lang1 = db().execute("SELECT language FROM users WHERE user_id=?", (user1_id,)).fetchone()[0]
+    lang2 = db().execute("SELECT language FROM users WHERE user_id=?", (user2_id,)).fetchone()[0]
     
     if lang1 == lang2 == "tr":
         tweet = (
@@ -176,262 +778,1016 @@ def create_match(user1_id, user1_name, user2_id, user2_name):
         )
     
     try:
-        print(f"Posting match tweet: {tweet}")
-        client.create_tweet(text=tweet)
-        cursor.execute(
-            "INSERT INTO games (game_id, user1_id, user2_id, deadline, status) "
-            "VALUES (?, ?, ?, ?, ?)",
-            (game_id, user1_id, user2_id, deadline, "pending")
+        with transaction() as conn:
+            game_id = next_game_id(conn)
+            conn.execute(
+                "INSERT INTO games (game_id, user1_id, user2_id, deadline, status) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (game_id, user1_id, user2_id, deadline, "pending")
+            )
+            today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+            conn.executemany(
+                "INSERT INTO daily_usage (user_id, day, games) VALUES (?, ?, 1) "
+                "ON CONFLICT(user_id, day) DO UPDATE SET games=games+1",
+                [(user1_id, today), (user2_id, today)]
+            )
+            enqueue_tweet(f"match:{game_id}", tweet, priority=PRIORITY_HIGH)
+            schedule_timer(settle_timer(game_id, deadline))
+        log.info("match_created", game_id=game_id, user1_id=user1_id, user2_id=user2_id)
+        return game_id
+    except sqlite3.IntegrityError as e:
+        if "idx_games_pending_pair" not in str(e):
+            log.error("match_failed", game_id=game_id, error=str(e))
+            return None
+        # The announcement and the usage count were rolled back with the game
+        log.info("match_already_pending", user1_id=user1_id, user2_id=user2_id)
+        return None
+    except sqlite3.Error as e:
+        log.error("match_failed", game_id=game_id, error=str(e))
+        return None
+
+MENTIONS_PAGE_SIZE = 100  # X API v2 max_results for the mentions timeline
+
+Mention = namedtuple("Mention", ["id", "author_id", "author_username", "text", "created_at", "entities"])
+
+def utc_iso(dt):
+    """Format a tweet timestamp the way deadlines are stored (naive UTC, seconds)."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+def utc_timestamp(iso):
+    """Unix time of a stored (naive UTC) timestamp."""
+    return datetime.datetime.fromisoformat(iso).replace(tzinfo=datetime.timezone.utc).timestamp()
+
+# Start time of the last poll that fetched every new mention; moves tweeted before it are recorded
+_ingest = {"complete_at": 0.0}
+
+def ingest_mentions():
+    """Page through all mentions since the watermark and store them in the mentions table.
+
+    The v2 timeline is newest-first, so the watermark only moves to the
+    highest ID once every page has been stored. If a page fails, what we got
+    is kept and the next poll fetches the rest again (duplicates are ignored).
+    """
+    since_id = _mention_watermark()
+    mentions = []
+    pagination_token = None
+    complete = False
+    started_at = time.time()
+    try:
+        while True:
+            page = api.call(
+                "mentions", x_backend().mentions, bot_identity().id, priority=PRIORITY_LOW, wait=False,
+                since_id=since_id, pagination_token=pagination_token, max_results=MENTIONS_PAGE_SIZE
+            )
+            mentions.extend(page.mentions)
+            pagination_token = page.next_token
+            if not pagination_token:
+                complete = True
+                break
+    except RateLimited as e:
+        log.warning("mentions_rate_limited", wait_seconds=round(e.wait_seconds))
+    except Exception as e:
+        log.error("mentions_fetch_failed", error=str(e))
+    return store_mentions(mentions, complete, started_at)
+
+def _mention_watermark():
+    last_mention_id = db().execute("SELECT value FROM settings WHERE key='last_mention_id'").fetchone()
+    last_mention_id = last_mention_id[0] if last_mention_id and last_mention_id[0] != "0" else None
+    log.debug("mentions_polling", since_id=last_mention_id)
+    return last_mention_id
+
+def store_mentions(mentions, complete, started_at):
+    """Store fetched mentions and record their moves; the watermark only moves if the fetch was complete."""
+    log.info("mentions_fetched", count=len(mentions), complete=complete)
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO mentions (mention_id, author_id, author_username, text, created_at, entities) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(int(m.id), m.author_id, m.author_username, m.text, utc_iso(m.created_at), json.dumps(m.entities))
+             for m in mentions]
         )
-        cursor.execute(
-            "UPDATE users SET games_today=games_today+1, last_game_date=? WHERE user_id IN (?, ?)",
-            (datetime.datetime.utcnow().strftime("%Y-%m-%d"), user1_id, user2_id)
+        for m in sorted(mentions, key=lambda m: int(m.id)):
+            record_move(int(m.id), m.author_id, m.text, utc_iso(m.created_at))
+        if complete and mentions:
+            newest = max(int(m.id) for m in mentions)
+            # A stream batch can be older than what a poll already stored, so never move back
+            conn.execute(
+                "INSERT INTO settings (key, value) VALUES ('last_mention_id', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=MAX(CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))",
+                (str(newest),)
+            )
+            log.debug("mention_watermark", mention_id=newest)
+    if complete:
+        _ingest["complete_at"] = max(_ingest["complete_at"], started_at)
+    return len(mentions)
+
+def record_move(mention_id, author_id, text, created_at):
+    """Store a move for the author's pending game if it was tweeted inside the move window; the caller commits."""
+    choice, word = parse_move_word(text)
+    if not choice:
+        return
+    window_start = (datetime.datetime.fromisoformat(created_at)
+                    - datetime.timedelta(seconds=MOVE_WINDOW_SECONDS)).isoformat()
+    conn = db()
+    games = conn.execute(
+        "SELECT game_id FROM games WHERE status='pending' AND (user1_id=? OR user2_id=?) "
+        "AND deadline<=? AND deadline>=?",
+        (author_id, author_id, created_at, window_start)
+    ).fetchall()
+    for (game_id,) in games:
+        # First move inside the window wins, later tweets don't overwrite it
+        conn.execute(
+            "INSERT OR IGNORE INTO moves (game_id, user_id, choice, word, mention_id, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (game_id, author_id, choice, word, mention_id, created_at)
         )
-        conn.commit()
-        print(f"Match created: {game_id}")
-    except Exception as e:
-        print(f"Match tweet error: {str(e)}")
+        log.info("move_recorded", game_id=game_id, mention_id=mention_id, user_id=author_id, move=choice)
 
 def process_mentions():
-    """Process mentions for participation and invites."""
+    """Process stored mentions for participation and invites."""
     try:
-        last_mention_id = cursor.execute("SELECT value FROM settings WHERE key='last_mention_id'").fetchone()
-        last_mention_id = last_mention_id[0] if last_mention_id else None
-        print(f"Checking mentions since ID: {last_mention_id}")
-        if last_mention_id is None:
-            print("No last_mention_id found, checking all mentions")
-        
-        try:
-            mentions_response = client.get_users_mentions(id=user.id, since_id=last_mention_id, user_fields=["username"], expansions=["author_id"])
-            mentions = mentions_response.data if mentions_response.data else []
-            print(f"Found {len(mentions)} new mentions")
-        except Exception as e:
-            print(f"Error fetching mentions: {str(e)}")
-            mentions = []
-        
+        mentions, invites = _unprocessed_mentions()
         if not mentions:
-            print("No new mentions found.")
             return
-        
-        for mention in mentions:
-            user_id = str(mention.author_id)
-            username = mention.username
-            text = mention.text.lower()
-            print(f"Processing mention from @{username}: {text}")
-            
-            eligible, error = check_user_eligibility(user_id, username)
-            if not eligible:
-                print(f"User @{username} not eligible: {error}")
+        # Resolve every author and invited user of this batch up front
+        users_by_id, users_by_name, unresolved = resolve_users(
+            user_ids=[mention.author_id for mention in mentions],
+            usernames=[invited[0] for invited in invites.values() if invited]
+        )
+        handle_mentions(_until_unresolved(mentions, invites, unresolved), invites, users_by_id, users_by_name)
+    except Exception:
+        log.exception("process_mentions_failed")
+        # The failed mention's queue changes were rolled back, resync the in-memory queue
+        load_match_queue()
+
+def _unprocessed_mentions():
+    """Stored mentions not in processed_mentions, in ID order, and the users each one invites.
+
+    Only mentions past the processed checkpoint are looked at; it stays at or
+    below the ingestion watermark, so a gap filled in later is still found.
+    """
+    last_processed = db().execute(
+        "SELECT value FROM settings WHERE key='last_processed_mention_id'"
+    ).fetchone()
+    last_processed = int(last_processed[0]) if last_processed else 0
+    rows = db().execute(
+        "SELECT m.mention_id, m.author_id, m.author_username, m.text, m.created_at, m.entities FROM mentions m "
+        "LEFT JOIN processed_mentions p ON p.mention_id=m.mention_id "
+        "WHERE m.mention_id>? AND p.mention_id IS NULL ORDER BY m.mention_id",
+        (last_processed,)
+    ).fetchall()
+    mentions = [Mention(*row[:5], json.loads(row[5])) for row in rows]
+    if not mentions:
+        log.debug("no_new_mentions")
+    invites = {}
+    bot_username = bot_identity().username.lower() if mentions else None
+    for mention in mentions:
+        entities = mention.entities or {}
+        invites[mention.id] = [m["username"] for m in entities.get("mentions", [])
+                               if m["username"].lower() != bot_username]
+    return mentions, invites
+
+def _until_unresolved(mentions, invites, unresolved):
+    """The mentions before the first whose author or invitee lookup failed; the rest wait for the next cycle."""
+    for i, mention in enumerate(mentions):
+        invited = invites[mention.id]
+        if str(mention.author_id) in unresolved or (invited and invited[0].lower() in unresolved):
+            log.warning("mentions_deferred", mention_id=mention.id, count=len(mentions) - i,
+                        reason="user_lookup_failed")
+            return mentions[:i]
+    return mentions
+
+MENTION_BATCH_SIZE = 100  # mentions handled per transaction
+
+def handle_mentions(mentions, invites, users_by_id, users_by_name):
+    """Handle mentions in ID order, committing them a batch at a time.
+
+    Every mention's outcome goes into processed_mentions in the same commit
+    as the processed checkpoint, so after a crash a batch is either fully
+    recorded or replayed from its start. A mention that raises is rolled back
+    on its own savepoint; the batch is committed up to it and the error
+    re-raised, so it is retried on the next cycle.
+    """
+    for start in range(0, len(mentions), MENTION_BATCH_SIZE):
+        handled = []
+        error = None
+        with transaction() as conn:
+            for mention in mentions[start:start + MENTION_BATCH_SIZE]:
                 try:
-                    client.create_tweet(text=f"@{username} {error}", in_reply_to_tweet_id=mention.id)
+                    with transaction():
+                        outcome = handle_mention(mention, users_by_id, users_by_name, invites[mention.id])
+                        conn.execute(
+                            "INSERT INTO processed_mentions (mention_id, outcome, processed_at) VALUES (?, ?, ?)",
+                            (mention.id, outcome, datetime.datetime.utcnow().isoformat())
+                        )
                 except Exception as e:
-                    print(f"Error replying to @{username}: {str(e)}")
-                continue
-            
-            lang = detect_language(text, username)
-            cursor.execute("UPDATE users SET language=? WHERE user_id=?", (lang, user_id))
-            print(f"Set language for @{username}: {lang}")
-            
-            if "oyun" in text or "game" in text:
-                print(f"Game request detected from @{username}")
-                invited = [u.username for u in mention.entities.get("mentions", []) if u.username != "apsnygame"]
-                if invited:
-                    invited_user = client.get_user(username=invited[0]).data
-                    invited_id = str(invited_user.id)
-                    invited_eligible, invited_error = check_user_eligibility(invited_id, invited[0])
-                    if invited_eligible:
-                        print(f"Creating match: @{username} vs @{invited[0]}")
-                        create_match(user_id, username, invited_id, invited[0])
-                    else:
-                        print(f"Invited user @{invited[0]} not eligible: {invited_error}")
-                        try:
-                            client.create_tweet(text=f"@{invited[0]} {invited_error}", in_reply_to_tweet_id=mention.id)
-                        except Exception as e:
-                            print(f"Error replying to @{invited[0]}: {str(e)}")
-                else:
-                    print(f"@{username} waiting for opponent")
-                    cursor.execute("UPDATE users SET status='waiting' WHERE user_id=?", (user_id,))
-                    cursor.execute(
-                        "SELECT user_id, username FROM users WHERE status='waiting' AND user_id!=? LIMIT 1",
-                        (user_id,)
-                    )
-                    opponent = cursor.fetchone()
-                    if opponent:
-                        print(f"Matched @{username} with @{opponent[1]}")
-                        create_match(user_id, username, opponent[0], opponent[1])
-                        cursor.execute("UPDATE users SET status='' WHERE user_id IN (?, ?)", (user_id, opponent[0]))
-            
-            cursor.execute(
-                "INSERT OR REPLACE INTO settings (key, value) VALUES ('last_mention_id', ?)",
-                (mention.id,)
-            )
-            conn.commit()
-            print(f"Updated last_mention_id to {mention.id}")
-    except Exception as e:
-        print(f"Error in process_mentions: {str(e)}")
+                    error = e
+                    break
+                handled.append(mention)
+            if handled:
+                # Mentions past the ingestion watermark may still have older ones missing (a partial
+                # poll stores the newest page first), so the checkpoint never passes it
+                conn.execute(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES ('last_processed_mention_id', "
+                    "MIN(?, (SELECT CAST(value AS INTEGER) FROM settings WHERE key='last_mention_id')))",
+                    (handled[-1].id,)
+                )
+        # Replies queued by the batch are only visible to the senders now
+        outbox_wakeup.set()
+        if handled:
+            MENTIONS_PROCESSED.inc(len(handled))
+            _newest_processed["created_at"] = utc_timestamp(handled[-1].created_at)
+        if error is not None:
+            raise error
 
-def check_games():
-    """Check games for choices and results."""
-    now = datetime.datetime.utcnow().isoformat()
-    cursor.execute("SELECT * FROM games WHERE status='pending' AND deadline<=?", (now,))
-    games = cursor.fetchall()
+# "oyun"/"game" as a word or hashtag, but not inside @apsnygame or other handles
+GAME_REQUEST = re.compile(r"(?<![\w@])#?(oyun|game)(?!\w)")
+
+def handle_mention(mention, users_by_id, users_by_name, invited):
+    """Handle one mention and return its outcome for processed_mentions; the caller commits."""
+    conn = db()
+    user_id = str(mention.author_id)
+    profile = users_by_id.get(user_id)
+    username = profile.username if profile else mention.author_username or user_id
+    text = mention.text.lower()
+    log.info("mention_received", mention_id=mention.id, user_id=user_id, username=username)
     
-    for game in games:
-        game_id, user1_id, user2_id, _, _, deadline, _, _ = game
-        user1_name = cursor.execute("SELECT username FROM users WHERE user_id=?", (user1_id,)).fetchone()[0]
-        user2_name = cursor.execute("SELECT username FROM users WHERE user_id=?", (user2_id,)).fetchone()[0]
-        
-        start_time = datetime.datetime.fromisoformat(deadline)
-        end_time = start_time + datetime.timedelta(seconds=1)
-        try:
-            mentions_response = client.get_users_mentions(id=user.id)
-            mentions = mentions_response.data if mentions_response.data else []
-        except Exception as e:
-            print(f"Error fetching mentions in check_games: {str(e)}")
-            continue
-        
-        user1_choice = None
-        user2_choice = None
-        
-        for mention in mentions:
-            mention_time = mention.created_at
-            if mention_time.isoformat() >= start_time.isoformat() and mention_time.isoformat() <= end_time.isoformat():
-                text = mention.text.lower()
-                if str(mention.author_id) == user1_id and any(c in text for c in ["taş", "kağıt", "makas", "rock", "paper", "scissors"]):
-                    user1_choice = next((c for c in ["taş", "kağıt", "makas", "rock", "paper", "scissors"] if c in text), None)
-                if str(mention.author_id) == user2_id and any(c in text for c in ["taş", "kağıt", "makas", "rock", "paper", "scissors"]):
-                    user2_choice = next((c for c in ["taş", "kağıt", "makas", "rock", "paper", "scissors"] if c in text), None)
-        
-        if not user1_choice and not user2_choice:
-            tweet = (
-                f"@{user1_name} ve @{user2_name} katılmadı! Yeni eşleşme aranıyor. $BSC"
-            )
-            cursor.execute("UPDATE users SET no_shows=no_shows+1 WHERE user_id IN (?, ?)", (user1_id, user2_id))
-            cursor.execute("UPDATE users SET banned=1, ban_until=? WHERE user_id IN (?, ?) AND no_shows>=2",
-                          ((datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat(), user1_id, user2_id))
-        elif not user1_choice:
+    eligible, error = check_user_eligibility(user_id, username, profile)
+    if not eligible:
+        log.info("not_eligible", mention_id=mention.id, user_id=user_id, reason=error)
+        enqueue_tweet(f"reply:{mention.id}:{user_id}", f"@{username} {error}", in_reply_to=mention.id)
+        return "not_eligible"
+    
+    lang = detect_language(text, profile)
+    conn.execute("UPDATE users SET language=? WHERE user_id=?", (lang, user_id))
+    log.debug("language_set", mention_id=mention.id, user_id=user_id, language=lang)
+    
+    if not GAME_REQUEST.search(text):
+        return "no_request"
+    log.debug("game_requested", mention_id=mention.id, user_id=user_id, invited=invited[:1])
+    if invited:
+        invited_user = users_by_name.get(invited[0].lower())
+        invited_id = str(invited_user.id) if invited_user else None
+        invited_eligible, invited_error = check_user_eligibility(invited_id, invited[0], invited_user)
+        if not invited_eligible:
+            log.info("not_eligible", mention_id=mention.id, user_id=invited_id, username=invited[0], reason=invited_error)
+            enqueue_tweet(f"reply:{mention.id}:{invited[0].lower()}", f"@{invited[0]} {invited_error}",
+                          in_reply_to=mention.id)
+            return "invitee_not_eligible"
+        log.debug("invite_accepted", mention_id=mention.id, user_id=user_id, invited=invited[0])
+        return "matched" if create_match(user_id, username, invited_id, invited[0]) else "match_failed"
+    opponent = find_random_opponent(user_id, username, lang, mention.id)
+    if not opponent:
+        log.info("waiting_for_opponent", mention_id=mention.id, user_id=user_id, language=lang)
+        return "queued"
+    log.info("random_match", mention_id=mention.id, user_id=user_id, opponent_id=opponent.user_id)
+    if not create_match(user_id, username, opponent.user_id, opponent.username):
+        queue_player(opponent)
+        return "match_failed"
+    return "matched"
+
+def settle_due_game(timer):
+    """Settle a game once mentions have been ingested past its move window.
+
+    Returns the time to try again while ingestion is still behind.
+    """
+    game = db().execute("SELECT * FROM games WHERE game_id=? AND status='pending'", (timer.arg,)).fetchone()
+    if game is None:
+        return None
+    if _ingest["complete_at"] < settle_timer(game[0], game[5]).due:
+        return time.time() + SETTLE_RETRY_SECONDS
+    with transaction() as conn:
+        settle_game(conn, game)
+    update_leaderboard(game[1], game[2])
+
+def settle_game(conn, game):
+    """Score one game, update both players and queue the result tweet."""
+    game_id, user1_id, user2_id, _, _, deadline, _, _ = game
+    user1_name = conn.execute("SELECT username FROM users WHERE user_id=?", (user1_id,)).fetchone()[0]
+    user2_name = conn.execute("SELECT username FROM users WHERE user_id=?", (user2_id,)).fetchone()[0]
+    
+    moves = {user_id: (choice, word or choice) for user_id, choice, word in
+             conn.execute("SELECT user_id, choice, word FROM moves WHERE game_id=?", (game_id,)).fetchall()}
+    user1_choice, user1_word = moves.get(user1_id, (None, None))
+    user2_choice, user2_word = moves.get(user2_id, (None, None))
+    
+    if not user1_choice and not user2_choice:
+        tweet = (
+            f"@{user1_name} ve @{user2_name} katılmadı! Yeni eşleşme aranıyor. $BSC"
+        )
+        winner_id = None
+        no_shows = [user1_id, user2_id]
+        conn.execute("UPDATE users SET no_shows=no_shows+1 WHERE user_id IN (?, ?)", (user1_id, user2_id))
+        conn.execute("UPDATE users SET banned=1, ban_until=? WHERE user_id IN (?, ?) AND no_shows>=2",
+                     ((datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat(), user1_id, user2_id))
+    elif not user1_choice:
+        tweet = (
+            f"@{user1_name} katılmadı, @{user2_name} kazandı! Kumbara: +1 BSC. $BSC"
+        )
+        conn.execute("UPDATE users SET no_shows=no_shows+1 WHERE user_id=?", (user1_id,))
+        conn.execute("UPDATE users SET banned=1, ban_until=? WHERE user_id=? AND no_shows>=2",
+                     ((datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat(), user1_id))
+        conn.execute("UPDATE users SET wins=wins+1, bsc_balance=bsc_balance+1 WHERE user_id=?", (user2_id,))
+        winner_id = user2_id
+        no_shows = [user1_id]
+    elif not user2_choice:
+        tweet = (
+            f"@{user2_name} katılmadı, @{user1_name} kazandı! Kumbara: +1 BSC. $BSC"
+        )
+        conn.execute("UPDATE users SET no_shows=no_shows+1 WHERE user_id=?", (user2_id,))
+        conn.execute("UPDATE users SET banned=1, ban_until=? WHERE user_id=? AND no_shows>=2",
+                     ((datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat(), user2_id))
+        conn.execute("UPDATE users SET wins=wins+1, bsc_balance=bsc_balance+1 WHERE user_id=?", (user1_id,))
+        winner_id = user1_id
+        no_shows = [user2_id]
+    else:
+        no_shows = []
+        if user1_choice == user2_choice:
             tweet = (
-                f"@{user1_name} katılmadı, @{user2_name} kazandı! Kumbara: +1 BSC. $BSC"
+                f"@{user1_name} ({user1_word}) vs @{user2_name} ({user2_word}): Berabere! Kumbara: +0.5 BSC. $BSC"
             )
-            cursor.execute("UPDATE users SET no_shows=no_shows+1 WHERE user_id=?", (user1_id,))
-            cursor.execute("UPDATE users SET banned=1, ban_until=? WHERE user_id=? AND no_shows>=2",
-                          ((datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat(), user1_id))
-            cursor.execute("UPDATE users SET wins=wins+1, bsc_balance=bsc_balance+1 WHERE user_id=?", (user2_id,))
-            winner_id = user2_id
-        elif not user2_choice:
+            conn.execute("UPDATE users SET bsc_balance=bsc_balance+0.5 WHERE user_id IN (?, ?)", (user1_id, user2_id))
+            winner_id = None
+        elif WIN_MATRIX[user1_choice] == user2_choice:
             tweet = (
-                f"@{user2_name} katılmadı, @{user1_name} kazandı! Kumbara: +1 BSC. $BSC"
+                f"@{user1_name} ({user1_word}) vs @{user2_name} ({user2_word}): @{user1_name} kazandı! Kumbara: +1 BSC. $BSC"
             )
-            cursor.execute("UPDATE users SET no_shows=no_shows+1 WHERE user_id=?", (user2_id,))
-            cursor.execute("UPDATE users SET banned=1, ban_until=? WHERE user_id=? AND no_shows>=2",
-                          ((datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat(), user2_id))
-            cursor.execute("UPDATE users SET wins=wins+1, bsc_balance=bsc_balance+1 WHERE user_id=?", (user1_id,))
+            conn.execute("UPDATE users SET wins=wins+1, bsc_balance=bsc_balance+1 WHERE user_id=?", (user1_id,))
             winner_id = user1_id
         else:
-            choice1 = CHOICES.get(user1_choice, user1_choice)
-            choice2 = CHOICES.get(user2_choice, user2_choice)
-            
-            if choice1 == choice2:
-                tweet = (
-                    f"@{user1_name} ({user1_choice}) vs @{user2_name} ({user2_choice}): Berabere! Kumbara: +0.5 BSC. $BSC"
-                )
-                cursor.execute("UPDATE users SET bsc_balance=bsc_balance+0.5 WHERE user_id IN (?, ?)", (user1_id, user2_id))
-                winner_id = None
-            elif WIN_MATRIX[choice1] == choice2:
-                tweet = (
-                    f"@{user1_name} ({user1_choice}) vs @{user2_name} ({user2_choice}): @{user1_name} kazandı! Kumbara: +1 BSC. $BSC"
-                )
-                cursor.execute("UPDATE users SET wins=wins+1, bsc_balance=bsc_balance+1 WHERE user_id=?", (user1_id,))
-                winner_id = user1_id
-            else:
-                tweet = (
-                    f"@{user1_name} ({user1_choice}) vs @{user2_name} ({user2_choice}): @{user2_name} kazandı! Kumbara: +1 BSC. $BSC"
-                )
-                cursor.execute("UPDATE users SET wins=wins+1, bsc_balance=bsc_balance+1 WHERE user_id=?", (user2_id,))
-                winner_id = user2_id
-        
-        cursor.execute(
-            "UPDATE games SET user1_choice=?, user2_choice=?, status='completed', winner_id=? WHERE game_id=?",
-            (user1_choice, user2_choice, winner_id, game_id)
-        )
-        cursor.execute("UPDATE users SET games_played=games_played+1 WHERE user_id IN (?, ?)", (user1_id, user2_id))
-        try:
-            print(f"Posting game result: {tweet}")
-            client.create_tweet(text=tweet)
-        except Exception as e:
-            print(f"Game result tweet error: {str(e)}")
-        conn.commit()
+            tweet = (
+                f"@{user1_name} ({user1_word}) vs @{user2_name} ({user2_word}): @{user2_name} kazandı! Kumbara: +1 BSC. $BSC"
+            )
+            conn.execute("UPDATE users SET wins=wins+1, bsc_balance=bsc_balance+1 WHERE user_id=?", (user2_id,))
+            winner_id = user2_id
+    
+    conn.execute(
+        "UPDATE games SET user1_choice=?, user2_choice=?, status='completed', winner_id=? WHERE game_id=?",
+        (user1_choice, user2_choice, winner_id, game_id)
+    )
+    conn.execute("UPDATE users SET games_played=games_played+1 WHERE user_id IN (?, ?)", (user1_id, user2_id))
+    record_daily_stats(conn, deadline[:10], (user1_id, user2_id), winner_id, no_shows)
+    enqueue_tweet(f"result:{game_id}", tweet, priority=PRIORITY_HIGH)
+
+def record_daily_stats(conn, day, players, winner_id, no_shows):
+    """Add one settled game to the daily rollups (same payouts as settle_game)."""
+    draw = winner_id is None and not no_shows
+    payouts = {user_id: 0.5 if draw else 1.0 if user_id == winner_id else 0.0 for user_id in players}
+    conn.executemany(
+        "INSERT INTO user_daily_stats (user_id, day, games, wins, draws, no_shows, payout) VALUES (?, ?, 1, ?, ?, ?, ?) "
+        "ON CONFLICT(user_id, day) DO UPDATE SET games=games+1, wins=wins+excluded.wins, "
+        "draws=draws+excluded.draws, no_shows=no_shows+excluded.no_shows, payout=payout+excluded.payout",
+        [(user_id, day, int(user_id == winner_id), int(draw), int(user_id in no_shows), payouts[user_id])
+         for user_id in players]
+    )
+    conn.execute(
+        "INSERT INTO daily_stats (day, games, no_shows, draws, payouts) VALUES (?, 1, ?, ?, ?) "
+        "ON CONFLICT(day) DO UPDATE SET games=games+1, no_shows=no_shows+excluded.no_shows, "
+        "draws=draws+excluded.draws, payouts=payouts+excluded.payouts",
+        (day, len(no_shows), int(draw), sum(payouts.values()))
+    )
 
-def reset_daily_limits():
-    """Reset daily game limits."""
-    cursor.execute("UPDATE users SET games_today=0, last_game_date=NULL")
-    conn.commit()
+# Daily limits need no reset: a new day simply has no daily_usage rows yet
+DAILY_USAGE_KEEP_DAYS = 7
+DAILY_USAGE_PRUNE_BATCH = 1000
+
+def prune_daily_usage():
+    """Delete daily_usage rows older than DAILY_USAGE_KEEP_DAYS, in short transactions."""
+    before = (datetime.datetime.utcnow() - datetime.timedelta(days=DAILY_USAGE_KEEP_DAYS)).strftime("%Y-%m-%d")
+    pruned = 0
+    while True:
+        with transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM daily_usage WHERE (user_id, day) IN "
+                "(SELECT user_id, day FROM daily_usage WHERE day<? LIMIT ?)",
+                (before, DAILY_USAGE_PRUNE_BATCH)
+            ).rowcount
+        pruned += deleted
+        if deleted < DAILY_USAGE_PRUNE_BATCH:
+            break
+    log.info("daily_usage_pruned", rows=pruned, before=before)
 
 # Leaderboard page
-@app.route("/leaderboard")
-def leaderboard():
-    cursor.execute("SELECT username, wins, bsc_balance FROM users ORDER BY wins DESC LIMIT 10")
-    leaders = cursor.fetchall()
-    html = """
+# Kept in memory and updated by settle_due_game as games are settled, so serving
+# the page never touches the database. The rendered page is cached until the
+# top of the table changes and revalidated with ETag/Last-Modified.
+LEADERBOARD_SIZE = 10
+LEADERBOARD_HTML = """
     <h1>🏆 Lider Tablosu</h1>
     <table border='1'>
         <tr><th>Sıra</th><th>Kullanıcı</th><th>Galibiyet</th><th>BSC Bakiyesi</th></tr>
         {% for leader in leaders %}
-        <tr><td>{{ loop.index }}</td><td>@{{ leader[0] }}</td><td>{{ leader[1] }}</td><td>{{ leader[2] }}</td></tr>
+        <tr><td>{{ loop.index }}</td><td>@{{ leader.username }}</td><td>{{ leader.wins }}</td><td>{{ leader.bsc_balance }}</td></tr>
         {% endfor %}
     </table>
     <p>Güncellenme: {{ now }}</p>
     """
-    return render_template_string(html, leaders=leaders, now=datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"))
+leaders = Leaderboard()
+_leaderboard_page = {"version": None, "leaders": None}
+_leaderboard_page_lock = Lock()
+
+def _player_rows(conn, where, params=()):
+    return [Player(*row) for row in conn.execute(
+        "SELECT user_id, username, wins, bsc_balance, games_played FROM users " + where, params
+    )]
+
+def load_leaderboard():
+    leaders.load(_player_rows(db(), "WHERE games_played>0"))
+
+def update_leaderboard(*user_ids):
+    for player in _player_rows(db(), f"WHERE user_id IN ({','.join('?' * len(user_ids))})", user_ids):
+        leaders.update(player)
+
+def leaderboard_page():
+    """The rendered top table, re-rendered only when it changed."""
+    with _leaderboard_page_lock:
+        page = _leaderboard_page
+        if page["version"] != leaders.version:
+            top = leaders.top(LEADERBOARD_SIZE)
+            if top != page["leaders"]:
+                updated = datetime.datetime.utcfromtimestamp(leaders.last_modified)
+                body = render_template_string(LEADERBOARD_HTML, leaders=top,
+                                              now=updated.strftime("%Y-%m-%d %H:%M UTC")).encode()
+                page.update(leaders=top, body=body, etag=hashlib.sha1(body).hexdigest(), last_modified=updated)
+            page["version"] = leaders.version
+        return page
+
+@web.route("/leaderboard")
+def leaderboard():
+    page = leaderboard_page()
+    response = Response(page["body"], mimetype="text/html")
+    response.set_etag(page["etag"])
+    response.last_modified = page["last_modified"]
+    response.cache_control.public = True
+    response.cache_control.no_cache = True  # cache, but revalidate every time
+    return response.make_conditional(request)
+
+# Leaderboard API
+# Pages use keyset cursors: each page continues after the last row of the
+# previous one through the sort's index, so deep pages cost the same as the first.
+LEADERBOARD_API_PAGE_SIZE = 50
+LEADERBOARD_API_MAX_PAGE_SIZE = 200
+LEADERBOARD_SORTS = {
+    "wins": ("wins", "bsc_balance"),
+    "balance": ("bsc_balance", "wins"),
+    "win_rate": ("wins * 1.0 / games_played", "wins"),
+}
+
+# The same sorts for a day or week, summed from the user_daily_stats rollups
+PERIOD_SORTS = {
+    "wins": ("SUM(s.wins)", "SUM(s.payout)"),
+    "balance": ("SUM(s.payout)", "SUM(s.wins)"),
+    "win_rate": ("SUM(s.wins) * 1.0 / SUM(s.games)", "SUM(s.wins)"),
+}
+LEADERBOARD_PERIODS = ("all", "day", "week")
+
+def _after_cursor_sql(first, second, user_id):
+    return (f"{first}<=? AND ({first}<? OR ({first}=? AND ({second}<? OR "
+            f"({second}=? AND {user_id}>?))))")
+
+def leaderboard_page_sql(sort, after_cursor):
+    """SELECT for one page; ordered best first, ties broken by user_id."""
+    first, second = LEADERBOARD_SORTS[sort]
+    sql = (f"SELECT user_id, username, wins, bsc_balance, games_played, {first}, {second} "
+           f"FROM users WHERE games_played>0")
+    if after_cursor:
+        sql += " AND " + _after_cursor_sql(first, second, "user_id")
+    return sql + f" ORDER BY {first} DESC, {second} DESC, user_id LIMIT ?"
+
+def period_leaderboard_sql(sort, after_cursor):
+    """Like leaderboard_page_sql, for games settled on or after a day (first parameter)."""
+    first, second = PERIOD_SORTS[sort]
+    sql = (f"SELECT s.user_id, u.username, SUM(s.wins), SUM(s.payout), SUM(s.games), {first}, {second} "
+           f"FROM user_daily_stats s INDEXED BY idx_user_daily_stats_day JOIN users u ON u.user_id=s.user_id WHERE s.day>=? GROUP BY s.user_id")
+    if after_cursor:
+        sql += " HAVING " + _after_cursor_sql(first, second, "s.user_id")
+    return sql + f" ORDER BY {first} DESC, {second} DESC, s.user_id LIMIT ?"
+
+def period_start(period):
+    """First day (UTC, ISO date) of the current day or week."""
+    today = datetime.datetime.utcnow().date()
+    if period == "week":
+        today -= datetime.timedelta(days=today.weekday())
+    return today.isoformat()
+
+def leaderboard_page_params(after_cursor, limit):
+    if not after_cursor:
+        return (limit,)
+    first, second, user_id = after_cursor
+    return (first, first, first, second, second, user_id, limit)
+
+HOT_QUERIES.update({
+    f"leaderboard_api_{sort}": (leaderboard_page_sql(sort, True), leaderboard_page_params((0, 0, ""), 1),
+                                f"idx_users_rank_{sort}")
+    for sort in LEADERBOARD_SORTS
+})
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(values, list) and len(values) == 3:
+            first, second, user_id = values
+            if isinstance(first, (int, float)) and isinstance(second, (int, float)) and isinstance(user_id, str):
+                return values
+    except ValueError:
+        pass
+    abort(400, "invalid cursor")
+
+def player_json(player):
+    return {
+        "username": player.username,
+        "wins": player.wins,
+        "bsc_balance": player.bsc_balance,
+        "games_played": player.games_played,
+        "win_rate": round(win_rate(player), 4),
+    }
+
+@web.route("/api/leaderboard")
+def leaderboard_api():
+    sort = request.args.get("sort", "wins")
+    if sort not in LEADERBOARD_SORTS:
+        abort(400, f"sort must be one of {', '.join(LEADERBOARD_SORTS)}")
+    period = request.args.get("period", "all")
+    if period not in LEADERBOARD_PERIODS:
+        abort(400, f"period must be one of {', '.join(LEADERBOARD_PERIODS)}")
+    limit = min(max(request.args.get("limit", LEADERBOARD_API_PAGE_SIZE, type=int), 1), LEADERBOARD_API_MAX_PAGE_SIZE)
+    after_cursor = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    params = leaderboard_page_params(after_cursor, limit + 1)
+    if period == "all":
+        rows = request_db().execute(leaderboard_page_sql(sort, after_cursor), params).fetchall()
+    else:
+        rows = request_db().execute(period_leaderboard_sql(sort, after_cursor),
+                                    (period_start(period),) + params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][5], rows[-1][6], rows[-1][0]])
+    return jsonify({
+        "sort": sort,
+        "period": period,
+        "players": [player_json(Player(*row[:5])) for row in rows],
+        "next_cursor": next_cursor,
+    })
+
+@web.route("/api/leaderboard/rank/<username>")
+def leaderboard_rank_api(username):
+    sort = request.args.get("sort", "wins")
+    if sort not in RANKINGS:
+        abort(400, f"sort must be one of {', '.join(RANKINGS)}")
+    found = leaders.rank(username.lstrip("@"), sort)
+    if found is None:
+        abort(404, "player has no finished games")
+    rank, player = found
+    return jsonify({"sort": sort, "rank": rank, "total": len(leaders), **player_json(player)})
+
+# Metrics, served at /metrics. Gauges with a function are read when scraped.
+POLL_CYCLE_SECONDS = metrics.Histogram("bot_poll_cycle_seconds", "Duration of one ingest and process cycle")
+POLL_ERRORS = metrics.Counter("bot_poll_errors", "Poll cycles that failed")
+MENTIONS_PROCESSED = metrics.Counter("bot_mentions_processed", "Mentions handled")
+API_SECONDS = metrics.Histogram("x_api_request_seconds", "X API call latency", ["endpoint"])
+API_ERRORS = metrics.Counter("x_api_errors", "Failed X API calls", ["endpoint", "status"])
+OUTBOX_FAILURES = metrics.Counter("outbox_send_failures", "Failed tweet posts", ["final"])
+TIMER_SECONDS = metrics.Histogram("timer_job_seconds", "Runtime of timer jobs", ["kind"])
+TIMER_FAILURES = metrics.Counter("timer_job_failures", "Timer jobs that raised", ["kind"])
+_newest_processed = {"created_at": None}
+
+def _record_api_call(endpoint, seconds, error):
+    API_SECONDS.labels(endpoint).observe(seconds)
+    if error is not None:
+        status = getattr(getattr(error, "response", None), "status_code", None) or type(error).__name__
+        API_ERRORS.labels(endpoint, status).inc()
+
+api.listeners.append(_record_api_call)
+
+metrics.Gauge("bot_mention_lag_seconds", "Now minus the created_at of the newest processed mention",
+              function=lambda: _newest_processed["created_at"] and time.time() - _newest_processed["created_at"])
+metrics.Gauge("x_api_rate_limit_remaining", "Calls left in the current rate-limit window", ["endpoint"],
+              function=lambda: {(endpoint,): bucket.remaining for endpoint, bucket in list(api.buckets.items())})
+metrics.Gauge("games_pending", "Games waiting to be settled",
+              function=lambda: request_db().execute("SELECT COUNT(*) FROM games WHERE status='pending'").fetchone()[0])
+metrics.Gauge("outbox_pending", "Tweets waiting to be posted",
+              function=lambda: request_db().execute("SELECT COUNT(*) FROM outbox WHERE status='pending'").fetchone()[0])
+metrics.Gauge("mention_stream_connected", "1 while the mention stream is connected; absent when polling",
+              function=lambda: None if _stream["connected"] is None else int(_stream["connected"]))
+metrics.Gauge("log_records_dropped", "Log records dropped because the log queue was full",
+              function=eventlog.dropped)
+metrics.Gauge("match_queue_depth", "Players waiting for a random opponent", ["language"],
+              function=lambda: {(language,): depth for language, depth in matchmaking.depth().items()})
+
+@web.route("/metrics")
+def metrics_page():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# Weekly report
+REPORT_PATH = os.getenv("REPORT_PATH", "weekly_report")  # extension is added from the format
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "ndjson")  # ndjson or csv
+REPORT_GZIP = os.getenv("REPORT_GZIP", "0") == "1"
+REPORT_CHUNK_ROWS = 1000
 
 def generate_weekly_report():
-    """Generate weekly JSON report."""
-    cursor.execute("SELECT user_id, username, games_played, wins, bsc_balance FROM users")
-    users = cursor.fetchall()
-    report = [
-        {
-            "user_id": u[0],
-            "username": u[1],
-            "games_played": u[2],
-            "wins": u[3],
-            "bsc_balance": u[4]
-        } for u in users
+    """Stream last week's per-user totals from the daily rollups to disk, see export.export_rows."""
+    week_end = datetime.datetime.utcnow().date()
+    week_start = week_end - datetime.timedelta(days=7)
+    fields = ["user_id", "username", "games", "wins", "draws", "no_shows", "bsc_earned"]
+    path = f"{REPORT_PATH}.{REPORT_FORMAT}" + (".gz" if REPORT_GZIP else "")
+    # A separate connection keeps this long read off the scheduler's writer connection
+    conn = connect()
+    try:
+        rows = conn.execute(
+            "SELECT s.user_id, u.username, SUM(s.games), SUM(s.wins), SUM(s.draws), SUM(s.no_shows), SUM(s.payout) "
+            "FROM user_daily_stats s INDEXED BY idx_user_daily_stats_day JOIN users u ON u.user_id=s.user_id "
+            "WHERE s.day>=? AND s.day<? GROUP BY s.user_id",
+            (week_start.isoformat(), week_end.isoformat())
+        )
+        manifest = export_rows(path, fields, fetch_chunks(rows, REPORT_CHUNK_ROWS),
+                               fmt=REPORT_FORMAT, compress=REPORT_GZIP)
+        games, no_shows, draws, payouts = conn.execute(
+            "SELECT COALESCE(SUM(games), 0), COALESCE(SUM(no_shows), 0), COALESCE(SUM(draws), 0), "
+            "COALESCE(SUM(payouts), 0) FROM daily_stats WHERE day>=? AND day<?",
+            (week_start.isoformat(), week_end.isoformat())
+        ).fetchone()
+    finally:
+        conn.close()
+    log.info("weekly_report_written", path=path, rows=manifest["rows"], bytes=manifest["bytes"],
+             week=week_start.isoformat(), games=games, no_shows=no_shows, draws=draws, payouts=payouts)
+
+# Timers
+# Extra wait after a game's move window, for tweets that show up late in the mentions timeline
+GAME_SETTLE_GRACE_SECONDS = int(os.getenv("GAME_SETTLE_GRACE_SECONDS", "30"))
+SETTLE_RETRY_SECONDS = 10
+TIMER_RETRY_SECONDS = 60
+MATCH_QUEUE_EXPIRE_INTERVAL = 600
+DAILY_USAGE_PRUNE_HOUR = 3  # UTC, away from the evening game rush
+timers = Timers()
+
+def settle_timer(game_id, deadline):
+    due = utc_timestamp(deadline) + MOVE_WINDOW_SECONDS + GAME_SETTLE_GRACE_SECONDS
+    return Timer(f"settle:{game_id}", "settle", due, game_id)
+
+def recurring_timers(now):
+    # Günlük ve haftalık işler, UTC
+    return [
+        Timer("prune_daily_usage", "prune_daily_usage", next_utc(now, DAILY_USAGE_PRUNE_HOUR), None),
+        Timer("weekly_report", "weekly_report", next_utc(now, 0, weekday=0), None),
+        Timer("expire_match_queue", "expire_match_queue", now + MATCH_QUEUE_EXPIRE_INTERVAL, None),
     ]
-    with open("weekly_report.json", "w") as f:
-        import json
-        json.dump(report, f, indent=2)
 
-# Scheduling
-schedule.every().day.at("00:00").do(reset_daily_limits)
-schedule.every().monday.at("00:00").do(generate_weekly_report)
-schedule.every().day.at("17:05").do(check_games)
+def schedule_timer(timer):
+    """Persist and schedule a timer, replacing one with the same key; the caller commits."""
+    db().execute("INSERT OR REPLACE INTO timers (key, kind, due, arg) VALUES (?, ?, ?, ?)", timer)
+    timers.add(timer)
+
+def load_timers():
+    """Rebuild the timer heap, adding timers for pending games and recurring jobs that have none."""
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO timers (key, kind, due, arg) VALUES (?, ?, ?, ?)",
+            [settle_timer(game_id, deadline) for game_id, deadline in conn.execute(
+                "SELECT game_id, deadline FROM games WHERE status='pending'"
+            ).fetchall()] + recurring_timers(time.time())
+        )
+        rows = conn.execute("SELECT key, kind, due, arg FROM timers").fetchall()
+    timers.load(Timer(*row) for row in rows)
+
+def run_prune_daily_usage(timer):
+    prune_daily_usage()
+    return next_utc(time.time(), DAILY_USAGE_PRUNE_HOUR)
 
-def run_schedule():
+def run_weekly_report(timer):
+    generate_weekly_report()
+    return next_utc(time.time(), 0, weekday=0)
+
+def run_expire_match_queue(timer):
+    expire_match_queue()
+    return time.time() + MATCH_QUEUE_EXPIRE_INTERVAL
+
+# Each handler returns when to fire again, or None when the timer is done
+TIMER_HANDLERS = {
+    "settle": settle_due_game,
+    "prune_daily_usage": run_prune_daily_usage,
+    "weekly_report": run_weekly_report,
+    "expire_match_queue": run_expire_match_queue,
+}
+
+def run_timers():
+    """Sleep until the next timer is due, run it, and persist the outcome."""
     while True:
-        schedule.run_pending()
-        time.sleep(60)
+        for timer in timers.wait_due():
+            try:
+                with TIMER_SECONDS.time(timer.kind):
+                    next_due = TIMER_HANDLERS[timer.kind](timer)
+            except Exception:
+                # The row keeps its old due time, so a restart retries it too
+                log.exception("timer_failed", key=timer.key, kind=timer.kind)
+                TIMER_FAILURES.labels(timer.kind).inc()
+                timers.add(timer._replace(due=time.time() + TIMER_RETRY_SECONDS))
+                continue
+            with transaction():
+                if next_due is None:
+                    db().execute("DELETE FROM timers WHERE key=?", (timer.key,))
+                else:
+                    schedule_timer(timer._replace(due=next_due))
 
 # Main bot loop
 def run_bot():
-    print("Starting bot loop...")
-    Thread(target=run_schedule).start()
+    log.info("bot_loop_starting")
+    Thread(target=run_timers, daemon=True).start()
+    start_outbox_senders()
     while True:
         try:
-            print("Running process_mentions...")
-            process_mentions()
-            time.sleep(60)
+            with POLL_CYCLE_SECONDS.time():
+                ingest_mentions()
+                process_mentions()
+            # Don't poll again before the mentions window has calls left
+            time.sleep(max(POLL_INTERVAL_SECONDS, api.wait_time("mentions")))
+        except Exception:
+            log.exception("poll_failed")
+            POLL_ERRORS.inc()
+            time.sleep(300)
+
+# Streaming ingestion (INGEST_MODE=stream)
+# Mentions are pushed over a filtered stream (see xapi.MentionStream) and
+# handled within seconds instead of on the next poll. Every time the stream
+# (re)connects, the polling path backfills what was posted while it was
+# down. Until that backfill is complete, ingestion counts as behind, so no
+# game is settled on missing moves, and streamed mentions wait to be handled
+# so they don't jump ahead of the ones in the gap; while the stream is down, the bot polls
+# every POLL_INTERVAL_SECONDS as in run_bot().
+INGEST_MODE = os.getenv("INGEST_MODE", "poll")  # poll or stream
+STREAM_BACKOFF_SECONDS = 1  # doubled after every connection that fails or drops at once
+STREAM_BACKOFF_MAX_SECONDS = 320
+STREAM_IDLE_SECONDS = 5
+STREAM_DELIVERY_SECONDS = 5  # a streamed tweet is assumed to arrive within this long of being posted
+STREAM_CONNECTED, STREAM_DISCONNECTED = "connected", "disconnected"
+_stream_events = queue.Queue()  # XMentions and connection changes, from the stream thread to the bot loop
+_stream = {"connected": None}  # None while polling
+
+def run_mention_stream():
+    """Keep the mention stream connected, reconnecting with exponential backoff."""
+    backoff = STREAM_BACKOFF_SECONDS
+    while True:
+        connected = Event()
+
+        def on_connect():
+            connected.set()
+            _stream_events.put(STREAM_CONNECTED)
+
+        try:
+            me = bot_identity()
+            # tweepy reconnects by itself after a drop; each drop still needs a backfill
+            x_mention_stream().run(f"@{me.username} -from:{me.username}", on_connect, _stream_events.put,
+                                   lambda: _stream_events.put(STREAM_DISCONNECTED))
+            log.warning("stream_closed")
         except Exception as e:
-            print(f"Bot error: {e}")
+            log.error("stream_failed", error=str(e))
+        _stream_events.put(STREAM_DISCONNECTED)
+        if connected.is_set():
+            backoff = STREAM_BACKOFF_SECONDS
+        log.info("stream_reconnecting", wait_seconds=backoff)
+        time.sleep(backoff)
+        backoff = min(backoff * 2, STREAM_BACKOFF_MAX_SECONDS)
+
+def _next_stream_events(timeout):
+    """Wait up to timeout for a stream event, then take every other one already queued."""
+    try:
+        events = [_stream_events.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+    while True:
+        try:
+            events.append(_stream_events.get_nowait())
+        except queue.Empty:
+            return events
+
+def _backfill_mentions():
+    """Poll the mentions timeline; True if everything since the watermark was fetched."""
+    started_at = time.time()
+    ingest_mentions()
+    return _ingest["complete_at"] >= started_at
+
+def run_bot_stream():
+    log.info("bot_loop_starting", ingest="stream")
+    Thread(target=run_timers, daemon=True).start()
+    start_outbox_senders()
+    _stream["connected"] = False
+    Thread(target=run_mention_stream, daemon=True).start()
+    backfilled = False  # connected, and polled since, so the stream has no gap
+    last_poll = 0.0
+    while True:
+        try:
+            events = _next_stream_events(STREAM_IDLE_SECONDS)
+            with POLL_CYCLE_SECONDS.time():
+                mentions = []
+                for event in events:
+                    if event in (STREAM_CONNECTED, STREAM_DISCONNECTED):
+                        _stream["connected"] = event == STREAM_CONNECTED
+                        backfilled = False
+                    else:
+                        mentions.append(event)
+                polled = False
+                if _stream["connected"] and not backfilled and api.wait_time("mentions") <= 0:
+                    log.info("stream_backfilling")
+                    backfilled = polled = _backfill_mentions()
+                elif not _stream["connected"] and time.time() - last_poll >= POLL_INTERVAL_SECONDS:
+                    last_poll = time.time()
+                    polled = _backfill_mentions()
+                if mentions:
+                    store_mentions(mentions, backfilled, time.time() - STREAM_DELIVERY_SECONDS)
+                elif backfilled:
+                    # Nothing new on a gap-free stream is as good as a complete poll
+                    _ingest["complete_at"] = max(_ingest["complete_at"], time.time() - STREAM_DELIVERY_SECONDS)
+                # Until the backfill after a (re)connect, older mentions may still be missing:
+                # streamed ones are stored (their moves count) but handled once the gap is filled
+                if (mentions or polled) and (backfilled or not _stream["connected"]):
+                    process_mentions()
+        except Exception:
+            log.exception("poll_failed")
+            POLL_ERRORS.inc()
             time.sleep(300)
 
-if __name__ == "__main__":
-    print("Main block starting...")
-    print("Initializing database...")
+# asyncio runtime (BOT_RUNTIME=async)
+# The same cycle as run_bot(), but the X calls that don't depend on each other
+# are in flight together: a batch's user lookups run concurrently, and the
+# outbox posts up to ASYNC_MAX_REQUESTS tweets at a time. Mentions are still
+# handled one by one in ID order by the same SQLite code, on the event loop
+# thread, and tweets that mention the same user are posted in outbox order.
+# Timers keep their own thread; what they queue is posted from here.
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "threads")  # threads or async
+ASYNC_MAX_REQUESTS = int(os.getenv("ASYNC_MAX_REQUESTS", "8"))  # X API calls in flight at once
+USER_HANDLE = re.compile(r"@(\w{1,15})")
+
+async def x_call_async(limit, endpoint, fn, *args, **kwargs):
+    """api.call_async() with at most limit's worth of calls in flight; a call waiting for its endpoint holds no slot."""
+    return await api.call_async(endpoint, fn, *args, limit=limit, **kwargs)
+
+async def ingest_mentions_async(backend, limit):
+    """ingest_mentions() on the async backend; the pages are still fetched one after the other."""
+    since_id = _mention_watermark()
+    mentions = []
+    pagination_token = None
+    complete = False
+    started_at = time.time()
+    try:
+        while True:
+            page = await x_call_async(
+                limit, "mentions", backend.mentions, bot_identity().id, priority=PRIORITY_LOW, wait=False,
+                since_id=since_id, pagination_token=pagination_token, max_results=MENTIONS_PAGE_SIZE
+            )
+            mentions.extend(page.mentions)
+            pagination_token = page.next_token
+            if not pagination_token:
+                complete = True
+                break
+    except RateLimited as e:
+        log.warning("mentions_rate_limited", wait_seconds=round(e.wait_seconds))
+    except Exception as e:
+        log.error("mentions_fetch_failed", error=str(e))
+    return store_mentions(mentions, complete, started_at)
+
+async def resolve_users_async(backend, limit, user_ids=(), usernames=()):
+    """resolve_users() with every lookup of the batch in flight at once.
+
+    Usernames are only skipped when the cache already ties them to a stale
+    ID, as the ID lookups haven't come back yet when the username ones go out.
+    """
+    now = datetime.datetime.utcnow()
+    by_id, by_username, stale_ids, stale_names = _cached_profiles(user_ids, usernames, now)
+    stale_names -= {by_id[i].username.lower() for i in stale_ids if i in by_id}
+    lookups = ([("ids", keys) for keys in _lookup_batches(stale_ids)]
+               + [("usernames", keys) for keys in _lookup_batches(stale_names)])
+
+    async def fetch(param, keys):
+        try:
+            return await x_call_async(limit, "users", backend.users, **{param: keys})
+        except Exception as e:
+            log.error("user_lookup_failed", by=param, count=len(keys), error=str(e))
+            return None
+
+    failed = {"ids": set(), "usernames": set()}
+    for (param, keys), users in zip(lookups, await asyncio.gather(*(fetch(*lookup) for lookup in lookups))):
+        if users is None:
+            failed[param].update(keys)
+        _add_profiles(by_id, by_username, users, now)
+    return by_id, by_username, _unresolved(by_id, by_username, failed["ids"], failed["usernames"])
+
+async def process_mentions_async(backend, limit):
+    """process_mentions() with the batch's user lookups overlapping."""
+    try:
+        mentions, invites = _unprocessed_mentions()
+        if not mentions:
+            return
+        users_by_id, users_by_name, unresolved = await resolve_users_async(
+            backend, limit,
+            user_ids=[mention.author_id for mention in mentions],
+            usernames=[invited[0] for invited in invites.values() if invited]
+        )
+        handle_mentions(_until_unresolved(mentions, invites, unresolved), invites, users_by_id, users_by_name)
+    except Exception:
+        log.exception("process_mentions_failed")
+        load_match_queue()
+
+async def run_outbox_async(backend, limit):
+    """Post due outbox tweets concurrently; a tweet waits for earlier ones that mention the same user."""
+    requeue_interrupted_tweets()
+    bot_username = bot_identity().username.lower()
+    in_flight = asyncio.Semaphore(ASYNC_MAX_REQUESTS)
+    last_post = {}  # lowercased username -> task posting the latest claimed tweet that mentions it
+
+    async def post(tweet, after):
+        try:
+            if after:
+                await asyncio.wait(after)
+            log.debug("tweet_posting", key=tweet.key, text=tweet.text)
+            try:
+                tweet_id = await x_call_async(limit, "tweets", backend.post, tweet.text, tweet.in_reply_to,
+                                              priority=tweet.priority)
+            except Exception as e:
+                _outbox_posted(tweet, error=e)
+            else:
+                _outbox_posted(tweet, tweet_id)
+        except Exception:
+            log.exception("outbox_sender_error")
+        finally:
+            in_flight.release()
+
+    def forget(task, users):
+        for user in users:
+            if last_post.get(user) is task:
+                del last_post[user]
+
+    while True:
+        await in_flight.acquire()
+        try:
+            tweet = _claim_outbox_tweet()
+        except Exception:
+            log.exception("outbox_sender_error")
+            tweet = None
+        if tweet is None:
+            in_flight.release()
+            await asyncio.to_thread(outbox_wakeup.wait, OUTBOX_IDLE_SECONDS)
+            outbox_wakeup.clear()
+            continue
+        users = set(USER_HANDLE.findall(tweet.text.lower())) - {bot_username}
+        after = {last_post[user] for user in users if user in last_post}
+        task = asyncio.create_task(post(tweet, after))
+        task.add_done_callback(lambda task, users=users: forget(task, users))
+        for user in users:
+            last_post[user] = task
+
+async def run_bot_async():
+    log.info("bot_loop_starting", runtime="async", max_requests=ASYNC_MAX_REQUESTS)
+    backend = x_async_backend()
+    limit = asyncio.Semaphore(ASYNC_MAX_REQUESTS)
+    bot_identity()  # fetched (blocking) at most once ever, before anything else is in flight
+    Thread(target=run_timers, daemon=True).start()
+    outbox = asyncio.create_task(run_outbox_async(backend, limit))  # kept referenced so it isn't collected
+    while True:
+        try:
+            with POLL_CYCLE_SECONDS.time():
+                await ingest_mentions_async(backend, limit)
+                await process_mentions_async(backend, limit)
+            # Don't poll again before the mentions window has calls left
+            await asyncio.sleep(max(POLL_INTERVAL_SECONDS, api.wait_time("mentions")))
+        except Exception:
+            log.exception("poll_failed")
+            POLL_ERRORS.inc()
+            await asyncio.sleep(300)
+
+def create_app():
+    """Flask app for the leaderboard; the database is opened per request."""
+    app = Flask(__name__)
+    app.register_blueprint(web)
+    return app
+
+def main(args):
+    eventlog.configure(os.getenv("LOG_LEVEL", "INFO"), LOG_SAMPLE_RATES)
+    if args == ["check-db"]:
+        # Migrate the database and verify the hot queries use their indexes
+        init_db()
+        problems = check_query_plans(db())
+        for problem in problems:
+            print(f"Query plan problem: {problem}")
+        print("Query plans OK" if not problems else f"{len(problems)} query plan problem(s)")
+        return 1 if problems else 0
+    log.info("database_initializing", path=DB_PATH)
     init_db()  # Veritabanını başlat
-    print("Starting bot thread...")
-    bot_thread = Thread(target=run_bot)
+    log.info("bot_thread_starting", backend=X_BACKEND, runtime=BOT_RUNTIME, ingest=INGEST_MODE)
+    if BOT_RUNTIME == "async":
+        if INGEST_MODE == "stream":
+            raise RuntimeError("INGEST_MODE=stream runs on the threads runtime, not BOT_RUNTIME=async")
+        bot_thread = Thread(target=lambda: asyncio.run(run_bot_async()))
+    else:
+        bot_thread = Thread(target=run_bot_stream if INGEST_MODE == "stream" else run_bot)
     bot_thread.daemon = True
     bot_thread.start()
-    print("Starting Flask app...")
-    app.run(host="0.0.0.0", port=8080, use_reloader=False)
+    log.info("web_starting", port=8080)
+    create_app().run(host="0.0.0.0", port=8080, use_reloader=False)
+    return 0
 
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
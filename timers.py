@@ -0,0 +1,101 @@
+"""Deadline-driven timers.
+
+Timers sit in a heap ordered by due time, so the runner sleeps exactly until
+the next one is due instead of polling. Adding a timer that is due earlier
+than the current head wakes the runner up. Replacing or cancelling a timer
+leaves its old heap entry behind; stale entries are skipped when they reach
+the top.
+
+Like MatchQueue, this only holds state in memory; the caller persists timers
+(see the timers table in the bot) and rebuilds them with load() at startup.
+"""
+import datetime
+import heapq
+import threading
+import time
+from collections import namedtuple
+
+Timer = namedtuple("Timer", ["key", "kind", "due", "arg"])
+
+
+def next_utc(now, hour, minute=0, weekday=None):
+    """Unix time of the next hour:minute UTC after now, on the given weekday (0 = Monday) if set."""
+    current = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+    due = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if weekday is not None:
+        due += datetime.timedelta(days=(weekday - due.weekday()) % 7)
+    if due <= current:
+        due += datetime.timedelta(days=7 if weekday is not None else 1)
+    return due.timestamp()
+
+
+class Timers:
+    def __init__(self):
+        self._heap = []
+        self._timers = {}
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def load(self, timers):
+        with self._cond:
+            self._timers = {timer.key: timer for timer in timers}
+            self._heap = [(timer.due, timer.key) for timer in self._timers.values()]
+            heapq.heapify(self._heap)
+            self._cond.notify_all()
+
+    def add(self, timer):
+        """Schedule a timer, replacing any timer with the same key."""
+        with self._cond:
+            self._timers[timer.key] = timer
+            heapq.heappush(self._heap, (timer.due, timer.key))
+            if self._heap[0][1] == timer.key:
+                self._cond.notify_all()
+
+    def cancel(self, key):
+        with self._cond:
+            return self._timers.pop(key, None)
+
+    def next_due(self):
+        with self._cond:
+            head = self._head()
+            return head.due if head else None
+
+    def pop_due(self, now):
+        """Remove and return every timer due at or before now, earliest first."""
+        due = []
+        with self._cond:
+            while True:
+                head = self._head()
+                if head is None or head.due > now:
+                    return due
+                heapq.heappop(self._heap)
+                del self._timers[head.key]
+                due.append(head)
+
+    def wait_due(self, timeout=None):
+        """Block until at least one timer is due (or timeout seconds pass) and return the due timers."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                due = self.pop_due(now)
+                if due or (deadline is not None and now >= deadline):
+                    return due
+                head = self._head()
+                wake = [t for t in (head.due if head else None, deadline) if t is not None]
+                self._cond.wait(max(min(wake) - now, 0) if wake else None)
+
+    def _head(self):
+        # Drop heap entries left behind by add() replacing a timer or cancel()
+        while self._heap:
+            due, key = self._heap[0]
+            timer = self._timers.get(key)
+            if timer is not None and timer.due == due:
+                return timer
+            heapq.heappop(self._heap)
+        return None
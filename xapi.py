@@ -0,0 +1,536 @@
+"""X API backends.
+
+The bot only needs four things from X: its own account, its mentions, user
+lookups and posting. Backend is that interface. V2Backend implements it on
+tweepy.Client, V1Backend on the v1.1 tweepy.API that the older copies of the
+bot used. FakeX is an in-process stand-in with scripted mentions, latencies,
+rate-limit headers and errors, for running and load-testing with no network.
+
+The asyncio runtime needs the same calls as coroutines: AsyncV2Backend runs
+them on tweepy's AsyncClient, AsyncFakeX on a FakeX whose latency is awaited
+instead of slept, so concurrent calls overlap the way real requests do.
+
+Mentions can also be pushed instead of polled. A MentionStream delivers them
+as they are posted: V2MentionStream over the v2 filtered stream, and
+FakeX.stream() as a local stand-in whose connection can be dropped to
+leave a gap, like a real disconnect.
+
+Every backend raises tweepy's exceptions (TooManyRequests, Forbidden, ...),
+so ApiDispatcher and the outbox handle errors the same way whichever is used.
+"""
+import asyncio
+import bisect
+import datetime
+import http
+import itertools
+import json
+import math
+import queue
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque, namedtuple
+
+import requests
+import tweepy
+
+try:
+    from tweepy.asynchronous import AsyncClient
+except tweepy.TweepyException:
+    # tweepy.asynchronous needs aiohttp, async-lru and oauthlib, only the asyncio runtime does
+    AsyncClient = None
+
+XUser = namedtuple("XUser", ["id", "username", "created_at", "tweet_count", "description"])
+XMention = namedtuple("XMention", ["id", "author_id", "author_username", "text", "created_at", "entities"])
+MentionPage = namedtuple("MentionPage", ["mentions", "next_token"])
+
+USER_FIELDS = ["created_at", "public_metrics", "description"]
+
+
+class Backend:
+    """What the bot calls on X. Method names match the ApiDispatcher endpoints in the bot."""
+
+    def attach(self, dispatcher):
+        """Report the rate-limit headers of every response to an ApiDispatcher."""
+        raise NotImplementedError
+
+    def me(self):
+        """The authenticated account, as an XUser."""
+        raise NotImplementedError
+
+    def mentions(self, user_id, since_id=None, pagination_token=None, max_results=100):
+        """One page of mentions newer than since_id, newest first."""
+        raise NotImplementedError
+
+    def users(self, ids=None, usernames=None):
+        """XUsers for the given IDs or usernames; unknown ones are left out."""
+        raise NotImplementedError
+
+    def post(self, text, in_reply_to=None):
+        """Post a tweet and return its ID."""
+        raise NotImplementedError
+
+
+class V2Backend(Backend):
+    def __init__(self, consumer_key, consumer_secret, access_token, access_token_secret):
+        self.client = tweepy.Client(
+            consumer_key=consumer_key,
+            consumer_secret=consumer_secret,
+            access_token=access_token,
+            access_token_secret=access_token_secret
+        )
+
+    def attach(self, dispatcher):
+        dispatcher.attach(self.client.session)
+
+    def me(self):
+        user = self.client.get_me().data
+        return XUser(str(user.id), user.username, None, None, None)
+
+    def mentions(self, user_id, since_id=None, pagination_token=None, max_results=100):
+        response = self.client.get_users_mentions(
+            id=user_id, since_id=since_id, pagination_token=pagination_token, max_results=max_results,
+            tweet_fields=["author_id", "created_at", "entities"], expansions=["author_id"]
+        )
+        return _mention_page(response)
+
+    def users(self, ids=None, usernames=None):
+        response = self.client.get_users(ids=ids, usernames=usernames, user_fields=USER_FIELDS)
+        return [XUser(str(u.id), u.username, u.created_at, u.public_metrics["tweet_count"], u.description or "")
+                for u in response.data or []]
+
+    def post(self, text, in_reply_to=None):
+        response = self.client.create_tweet(text=text, in_reply_to_tweet_id=in_reply_to)
+        return str(response.data["id"])
+
+
+def _mention_page(response):
+    """A v2 mentions response as a MentionPage, with author usernames from the author_id expansion."""
+    authors = {str(u.id): u.username for u in (response.includes or {}).get("users", [])}
+    mentions = [XMention(str(t.id), str(t.author_id), authors.get(str(t.author_id)), t.text, t.created_at,
+                         t.entities or {})
+                for t in response.data or []]
+    return MentionPage(mentions, (response.meta or {}).get("next_token"))
+
+
+class V1Backend(Backend):
+    """The v1.1 API. Mentions are paged with max_id, which is what the page token holds."""
+
+    def __init__(self, consumer_key, consumer_secret, access_token, access_token_secret):
+        self.api = tweepy.API(tweepy.OAuth1UserHandler(consumer_key, consumer_secret, access_token,
+                                                       access_token_secret))
+
+    def attach(self, dispatcher):
+        dispatcher.attach(self.api.session)
+
+    def me(self):
+        return self._user(self.api.verify_credentials())
+
+    def mentions(self, user_id, since_id=None, pagination_token=None, max_results=100):
+        statuses = self.api.mentions_timeline(since_id=since_id, max_id=pagination_token, count=max_results,
+                                              tweet_mode="extended")
+        mentions = [
+            XMention(s.id_str, s.user.id_str, s.user.screen_name, s.full_text, s.created_at,
+                     {"mentions": [{"id": m["id_str"], "username": m["screen_name"]}
+                                   for m in s.entities.get("user_mentions", [])]})
+            for s in statuses
+        ]
+        next_token = str(min(s.id for s in statuses) - 1) if len(statuses) == max_results else None
+        return MentionPage(mentions, next_token)
+
+    def users(self, ids=None, usernames=None):
+        try:
+            return [self._user(u) for u in self.api.lookup_users(user_id=ids, screen_name=usernames)]
+        except tweepy.NotFound:
+            return []
+
+    def post(self, text, in_reply_to=None):
+        status = self.api.update_status(status=text, in_reply_to_status_id=in_reply_to,
+                                        auto_populate_reply_metadata=in_reply_to is not None)
+        return status.id_str
+
+    def _user(self, user):
+        return XUser(user.id_str, user.screen_name, user.created_at, user.statuses_count, user.description or "")
+
+
+class AsyncV2Backend(Backend):
+    """V2Backend with coroutine methods, on tweepy's AsyncClient."""
+
+    def __init__(self, consumer_key, consumer_secret, access_token, access_token_secret):
+        if AsyncClient is None:
+            raise RuntimeError("The asyncio runtime needs tweepy[async] (aiohttp, async-lru, oauthlib)")
+        self.client = _HeaderAsyncClient(
+            consumer_key=consumer_key,
+            consumer_secret=consumer_secret,
+            access_token=access_token,
+            access_token_secret=access_token_secret
+        )
+
+    def attach(self, dispatcher):
+        self.client.hooks.append(dispatcher.observe)
+
+    async def me(self):
+        user = (await self.client.get_me()).data
+        return XUser(str(user.id), user.username, None, None, None)
+
+    async def mentions(self, user_id, since_id=None, pagination_token=None, max_results=100):
+        response = await self.client.get_users_mentions(
+            id=user_id, since_id=since_id, pagination_token=pagination_token, max_results=max_results,
+            tweet_fields=["author_id", "created_at", "entities"], expansions=["author_id"]
+        )
+        return _mention_page(response)
+
+    async def users(self, ids=None, usernames=None):
+        response = await self.client.get_users(ids=ids, usernames=usernames, user_fields=USER_FIELDS)
+        return [XUser(str(u.id), u.username, u.created_at, u.public_metrics["tweet_count"], u.description or "")
+                for u in response.data or []]
+
+    async def post(self, text, in_reply_to=None):
+        response = await self.client.create_tweet(text=text, in_reply_to_tweet_id=in_reply_to)
+        return str(response.data["id"])
+
+
+if AsyncClient is not None:
+    class _HeaderAsyncClient(AsyncClient):
+        """AsyncClient has no session hooks like requests; this passes every response's headers on."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.hooks = []
+
+        async def request(self, *args, **kwargs):
+            try:
+                response = await super().request(*args, **kwargs)
+            except tweepy.HTTPException as e:
+                self._report(e.response.headers)
+                raise
+            self._report(response.headers)
+            return response
+
+        def _report(self, headers):
+            for hook in self.hooks:
+                hook(headers)
+
+
+class MentionStream:
+    """A push connection that delivers mentions as they are posted."""
+
+    def run(self, rule, on_connect, on_mention, on_disconnect):
+        """Stream tweets matching rule until the connection ends.
+
+        on_connect() is called every time the connection is (re)established,
+        on_disconnect() every time it drops, even if it is then retried, and
+        on_mention(XMention) for every tweet. Returns when the connection is
+        closed and won't be retried, raises if it couldn't be made.
+        """
+        raise NotImplementedError
+
+    def disconnect(self):
+        raise NotImplementedError
+
+
+STREAM_RULE_TAG = "bot-mentions"
+
+
+class V2MentionStream(MentionStream):
+    """The v2 filtered stream, with one rule tagged STREAM_RULE_TAG. Needs an app bearer token.
+
+    tweepy reconnects by itself after network errors and when X closes the
+    stream (calling on_disconnect, then on_connect again); an HTTP error such
+    as 429 ends run().
+    """
+
+    def __init__(self, bearer_token):
+        self.bearer_token = bearer_token
+        self.client = None
+
+    def run(self, rule, on_connect, on_mention, on_disconnect):
+        self.client = client = _StreamingClient(self.bearer_token, on_connect, on_mention, on_disconnect)
+        rules = client.get_rules().data or []
+        if not any(r.value == rule for r in rules):
+            stale = [r.id for r in rules if r.tag == STREAM_RULE_TAG]
+            if stale:
+                client.delete_rules(stale)
+            client.add_rules(tweepy.StreamRule(rule, tag=STREAM_RULE_TAG))
+        client.filter(expansions=["author_id"], tweet_fields=["author_id", "created_at", "entities"])
+        if client.error is not None:
+            raise client.error
+
+    def disconnect(self):
+        if self.client is not None:
+            self.client.disconnect()
+
+
+class _StreamingClient(tweepy.StreamingClient):
+    def __init__(self, bearer_token, on_connect, on_mention, on_disconnect):
+        # HTTP errors end filter() so the caller's backoff handles them
+        super().__init__(bearer_token, max_retries=0)
+        self._on_connect = on_connect
+        self._on_mention = on_mention
+        self._on_disconnect = on_disconnect
+        self.error = None
+
+    def on_connect(self):
+        self._on_connect()
+
+    def on_connection_error(self):
+        super().on_connection_error()
+        self._on_disconnect()
+
+    def on_closed(self, response):
+        super().on_closed(response)
+        self._on_disconnect()
+
+    def on_response(self, response):
+        tweet = response.data
+        if tweet is None:
+            return
+        authors = {str(u.id): u.username for u in response.includes.get("users", [])}
+        self._on_mention(XMention(str(tweet.id), str(tweet.author_id), authors.get(str(tweet.author_id)),
+                                  tweet.text, tweet.created_at, tweet.entities or {}))
+
+    def on_request_error(self, status_code):
+        self.error = tweepy.TweepyException(f"Stream HTTP error {status_code}")
+
+    def on_exception(self, exception):
+        self.error = exception
+
+
+class FakeX(Backend):
+    """In-process stand-in for X.
+
+    Mentions are added with post_mention() and can become visible only after
+    a delay, like X's indexing lag. Every call sleeps for latency seconds (a
+    number or a (low, high) range) and counts against its endpoint's
+    (limit, window seconds) from rate_limits. Every response reports
+    x-rate-limit-* headers. A call fails with a 503 with error_rate
+    probability, or with any status queued by fail_next().
+
+    stream() connects to the mentions as they are posted, and drop_streams()
+    closes every connection; mentions posted before the next connect are
+    only found by polling. fail_next("stream") makes connecting fail.
+    """
+
+    RATE_LIMITS = {"me": (75, 900), "mentions": (180, 900), "users": (900, 900), "tweets": (200, 900)}
+
+    def __init__(self, username="apsnygame", user_id="1", latency=0.0, rate_limits=None, error_rate=0.0,
+                 seed=None):
+        self.latency = latency
+        self.rate_limits = dict(self.RATE_LIMITS if rate_limits is None else rate_limits)
+        self.error_rate = error_rate
+        self.account = XUser(user_id, username, datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+                             1000, "")
+        self.calls = Counter()
+        self.tweets = []
+        self._users = {}
+        self._mention_ids = []
+        self._mentions = []
+        self._texts = set()
+        self._ids = itertools.count(10 ** 15)
+        self._windows = {}
+        self._failures = defaultdict(deque)
+        self._hooks = []
+        self._streams = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def attach(self, dispatcher):
+        self._hooks.append(dispatcher.observe)
+
+    def add_user(self, user_id, username, age_days=365, tweet_count=100, description=""):
+        created_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=age_days)
+        user = XUser(str(user_id), username, created_at.replace(microsecond=0), tweet_count, description)
+        with self._lock:
+            self._users[user.id] = user
+        return user
+
+    def post_mention(self, author_id, text, mentioned=(), created_at=None, delay=0.0):
+        """Add a mention of the bot by author_id; returns its ID."""
+        created_at = created_at or datetime.datetime.now(datetime.timezone.utc)
+        entities = {"mentions": [{"username": name} for name in (self.account.username,) + tuple(mentioned)]}
+        with self._lock:
+            author = self._users.get(str(author_id))
+            mention = XMention(str(next(self._ids)), str(author_id), author and author.username, text, created_at,
+                               entities)
+            self._mention_ids.append(int(mention.id))
+            self._mentions.append((time.time() + delay, mention))
+            for events in self._streams:
+                events.put(mention)
+        return mention.id
+
+    def fail_next(self, endpoint, status=503, count=1):
+        """Make the next count calls to endpoint fail with the given HTTP status."""
+        with self._lock:
+            self._failures[endpoint].extend([status] * count)
+
+    def stream(self):
+        return _FakeStream(self)
+
+    def drop_streams(self):
+        """Close every stream connection, as when X disconnects."""
+        with self._lock:
+            for events in self._streams:
+                events.put(None)
+            self._streams = []
+
+    def me(self):
+        self._request("me")
+        return self.account
+
+    def mentions(self, user_id, since_id=None, pagination_token=None, max_results=100):
+        self._request("mentions")
+        return self._mentions_page(since_id, pagination_token, max_results)
+
+    def users(self, ids=None, usernames=None):
+        self._request("users")
+        return self._lookup(ids, usernames)
+
+    def post(self, text, in_reply_to=None):
+        self._request("tweets")
+        return self._post(text, in_reply_to)
+
+    def _mentions_page(self, since_id, pagination_token, max_results):
+        now = time.time()
+        page = []
+        with self._lock:
+            start = bisect.bisect_right(self._mention_ids, int(since_id)) if since_id else 0
+            end = bisect.bisect_right(self._mention_ids, int(pagination_token)) if pagination_token else len(self._mentions)
+            # Walk back from the newest, one more than a page to know if there is a next one
+            while end > start and len(page) <= max_results:
+                end -= 1
+                visible_at, mention = self._mentions[end]
+                if visible_at <= now:
+                    page.append(mention)
+        next_token = str(int(page[max_results - 1].id) - 1) if len(page) > max_results else None
+        return MentionPage(page[:max_results], next_token)
+
+    def _lookup(self, ids, usernames):
+        with self._lock:
+            if ids:
+                return [self._users[i] for i in map(str, ids) if i in self._users]
+            names = {name.lower() for name in usernames or ()}
+            return [u for u in self._users.values() if u.username.lower() in names]
+
+    def _post(self, text, in_reply_to):
+        with self._lock:
+            if text in self._texts:
+                raise self._error(403, {}, "You are not allowed to create a Tweet with duplicate content.")
+            self._texts.add(text)
+            tweet_id = str(next(self._ids))
+            self.tweets.append((tweet_id, text, in_reply_to))
+        return tweet_id
+
+    def _request(self, endpoint):
+        latency = self._latency()
+        if latency:
+            time.sleep(latency)
+        self._respond(endpoint)
+
+    def _latency(self):
+        if isinstance(self.latency, tuple):
+            with self._lock:
+                return self._random.uniform(*self.latency)
+        return self.latency
+
+    def _respond(self, endpoint):
+        """Count the call against its rate limit, report the headers and raise any queued failure."""
+        with self._lock:
+            self.calls[endpoint] += 1
+            now = time.time()
+            headers = {}
+            failure = None
+            if endpoint in self.rate_limits:
+                limit, window = self.rate_limits[endpoint]
+                state = self._windows.get(endpoint)
+                if state is None or now >= state[1]:
+                    state = self._windows[endpoint] = [limit, now + window]
+                if state[0] > 0:
+                    state[0] -= 1
+                else:
+                    failure = 429
+                headers = {"x-rate-limit-limit": str(limit), "x-rate-limit-remaining": str(state[0]),
+                           "x-rate-limit-reset": str(math.ceil(state[1]))}
+            if failure is None and self._failures[endpoint]:
+                failure = self._failures[endpoint].popleft()
+            elif failure is None and self._random.random() < self.error_rate:
+                failure = 503
+        for hook in self._hooks:
+            hook(headers)
+        if failure:
+            raise self._error(failure, headers, f"{endpoint} failed")
+
+    def _error(self, status, headers, detail):
+        response = requests.Response()
+        response.status_code = status
+        response.reason = http.HTTPStatus(status).phrase
+        response.headers.update(headers)
+        response._content = json.dumps({"detail": detail}).encode()
+        if status == 429:
+            return tweepy.TooManyRequests(response, reset_time=int(headers["x-rate-limit-reset"]))
+        errors = {400: tweepy.BadRequest, 401: tweepy.Unauthorized, 403: tweepy.Forbidden, 404: tweepy.NotFound}
+        return errors.get(status, tweepy.TwitterServerError)(response)
+
+
+class _FakeStream(MentionStream):
+    """Delivers every mention of the fake account that it didn't post itself; the rule is only recorded."""
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.rule = None
+        self._events = None
+
+    def run(self, rule, on_connect, on_mention, on_disconnect):
+        self.rule = rule
+        self.fake._request("stream")
+        self._events = events = queue.Queue()
+        with self.fake._lock:
+            self.fake._streams.append(events)
+        on_connect()
+        bot = self.fake.account
+        while True:
+            mention = events.get()
+            if mention is None:
+                on_disconnect()
+                return
+            if mention.author_id != bot.id and any(m["username"].lower() == bot.username.lower()
+                                                   for m in mention.entities.get("mentions", [])):
+                on_mention(mention)
+
+    def disconnect(self):
+        with self.fake._lock:
+            if self._events in self.fake._streams:
+                self.fake._streams.remove(self._events)
+        if self._events is not None:
+            self._events.put(None)
+
+
+class AsyncFakeX(Backend):
+    """Coroutine view of a FakeX: same users, mentions, limits and tweets, with the latency awaited."""
+
+    def __init__(self, fake):
+        self.fake = fake
+
+    def attach(self, dispatcher):
+        self.fake.attach(dispatcher)
+
+    async def me(self):
+        await self._request("me")
+        return self.fake.account
+
+    async def mentions(self, user_id, since_id=None, pagination_token=None, max_results=100):
+        await self._request("mentions")
+        return self.fake._mentions_page(since_id, pagination_token, max_results)
+
+    async def users(self, ids=None, usernames=None):
+        await self._request("users")
+        return self.fake._lookup(ids, usernames)
+
+    async def post(self, text, in_reply_to=None):
+        await self._request("tweets")
+        return self.fake._post(text, in_reply_to)
+
+    async def _request(self, endpoint):
+        latency = self.fake._latency()
+        if latency:
+            await asyncio.sleep(latency)
+        self.fake._respond(endpoint)